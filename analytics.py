@@ -0,0 +1,429 @@
+"""Route and load-factor analytics.
+
+Seats sold, load factor and revenue by class are materialised per flight in
+``FlightStats``, rolled up per route in ``RouteStats`` and network-wide in
+``AnalyticsTotals``; ``BookingPace`` holds bookings made per day and class
+over the last ``ANALYTICS_PACE_DAYS`` days. When a flight is archived, the
+archive job folds its stats into ``ArchivedRouteStats``, which the route
+roll-up includes, so departed flights stay in the figures. Every booking, cancellation and flight update logs a ``FlightChange``
+stamped with the commit-ordered flight data version, so the tables are
+refreshed incrementally: only flights changed since the stored watermark
+version are recomputed, with one GROUP BY over their bookings and
+a vectorised NumPy pass for capacity and load factors.
+
+The operator dashboard only reads the summary tables and reports how many
+changes are still pending; folding them in is left to
+``flask refresh-analytics`` and the scheduler.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+import numpy as np
+from flask import jsonify, request
+from sqlalchemy import case, delete, func, insert, literal, select, tuple_, union_all, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from cache import current_flight_data_version
+from auth import operator_required
+from models import (AnalyticsTotals, AnalyticsWatermark, ArchivedRouteStats, Booking, BookingPace, FareBasis, Flight,
+                    FlightChange, FlightStats, RouteStats)
+from pricing import TRAVEL_CLASSES
+
+logger = logging.getLogger(__name__)
+
+WATERMARK = 'analytics'
+
+# Flights recomputed per statement, to keep IN lists reasonable
+STATS_CHUNK_SIZE = 500
+
+# Per-class columns shared by FlightStats and the tables that sum it
+CLASS_COLUMNS = [f'{measure}_{c}' for measure in ('capacity', 'sold', 'revenue') for c in TRAVEL_CLASSES]
+
+
+def _load_flights(flight_ids):
+    flights = db.session.execute(
+        select(
+            Flight.id, Flight.flight_number, Flight.origin, Flight.destination,
+            Flight.departure_time, Flight.status,
+            Flight.available_seats_economy, Flight.available_seats_premium, Flight.available_seats_business,
+            FareBasis.capacity_economy, FareBasis.capacity_premium, FareBasis.capacity_business,
+        )
+        .outerjoin(FareBasis, FareBasis.flight_id == Flight.id)
+        .where(Flight.id.in_(flight_ids))
+        .order_by(Flight.id)
+    ).all()
+    sales = db.session.execute(
+        select(Booking.flight_id, Booking.travel_class, func.count(Booking.id), func.sum(Booking.price_paid))
+        .where(Booking.flight_id.in_(flight_ids), Booking.status == 'Confirmed')
+        .group_by(Booking.flight_id, Booking.travel_class)
+    ).all()
+    return flights, sales
+
+
+def compute_flight_stats(flights, sales):
+    """Turn flight rows and per-class booking aggregates into FlightStats rows."""
+    if not flights:
+        return []
+
+    columns = list(zip(*flights))
+    ids = np.array(columns[0], dtype=np.int64)
+    available = np.nan_to_num(np.array(columns[6:9], dtype=np.float64))
+    capacity = np.array(columns[9:12], dtype=np.float64)
+
+    booked = np.zeros((len(TRAVEL_CLASSES), ids.size))
+    revenue = np.zeros((len(TRAVEL_CLASSES), ids.size))
+    if sales:
+        flight_ids, classes, counts, totals = zip(*sales)
+        position = np.searchsorted(ids, np.array(flight_ids, dtype=np.int64))
+        klass = np.array([TRAVEL_CLASSES.index(c) if c in TRAVEL_CLASSES else -1 for c in classes])
+        known = klass >= 0
+        np.add.at(booked, (klass[known], position[known]), np.array(counts, dtype=np.float64)[known])
+        np.add.at(revenue, (klass[known], position[known]), np.array(totals, dtype=np.float64)[known])
+
+    # Flights not yet repriced have no FareBasis; derive capacity the same way
+    capacity = np.where(np.isnan(capacity), available + booked, capacity)
+    sold = np.clip(capacity - available, 0, None)
+    total_capacity = capacity.sum(axis=0)
+    load_factor = np.divide(sold.sum(axis=0), total_capacity,
+                            out=np.zeros_like(total_capacity), where=total_capacity > 0)
+
+    capacity, sold, revenue = capacity.astype(int).tolist(), sold.astype(int).tolist(), np.round(revenue, 2).tolist()
+    return [
+        {
+            'flight_id': row[0],
+            'flight_number': row[1],
+            'origin': row[2],
+            'destination': row[3],
+            'departure_time': row[4],
+            'status': row[5],
+            'capacity_economy': capacity[0][i],
+            'capacity_premium': capacity[1][i],
+            'capacity_business': capacity[2][i],
+            'sold_economy': sold[0][i],
+            'sold_premium': sold[1][i],
+            'sold_business': sold[2][i],
+            'revenue_economy': revenue[0][i],
+            'revenue_premium': revenue[1][i],
+            'revenue_business': revenue[2][i],
+            'load_factor': round(float(load_factor[i]), 4),
+        }
+        for i, row in enumerate(flights)
+    ]
+
+
+def refresh_flight_stats(flight_ids):
+    """Recompute FlightStats for the given flights; returns the routes touched."""
+    routes = set()
+    flight_ids = list(flight_ids)
+    for start in range(0, len(flight_ids), STATS_CHUNK_SIZE):
+        chunk = flight_ids[start:start + STATS_CHUNK_SIZE]
+        # Old rows name the route a flight was on before it changed. Flights
+        # that are gone lose their row; archived ones were already folded into
+        # ArchivedRouteStats by archive_flight_stats
+        routes.update(db.session.execute(
+            select(FlightStats.origin, FlightStats.destination).where(FlightStats.flight_id.in_(chunk))
+        ).all())
+        db.session.execute(delete(FlightStats).where(FlightStats.flight_id.in_(chunk)))
+
+        rows = compute_flight_stats(*_load_flights(chunk))
+        if rows:
+            db.session.execute(insert(FlightStats), rows)
+            routes.update((row['origin'], row['destination']) for row in rows)
+    return routes
+
+
+def refresh_route_stats(routes=None):
+    """Rebuild RouteStats for the given (origin, destination) pairs, or all routes."""
+    routes = None if routes is None else sorted(routes)
+    if routes == []:
+        return
+
+    # Live flights one row each, plus the archived totals per route
+    sources = union_all(
+        select(FlightStats.origin, FlightStats.destination, literal(1).label('flights'),
+               *(getattr(FlightStats, name) for name in CLASS_COLUMNS)),
+        select(ArchivedRouteStats.origin, ArchivedRouteStats.destination, ArchivedRouteStats.flights,
+               *(getattr(ArchivedRouteStats, name) for name in CLASS_COLUMNS)),
+    ).subquery()
+    sums = {name: func.sum(sources.c[name]) for name in ['flights'] + CLASS_COLUMNS}
+    capacity = sum(sums[f'capacity_{c}'] for c in TRAVEL_CLASSES)
+    sold = sum(sums[f'sold_{c}'] for c in TRAVEL_CLASSES)
+    rollup = select(
+        sources.c.origin,
+        sources.c.destination,
+        *sums.values(),
+        capacity,
+        sold,
+        case((capacity > 0, 1.0 * sold / capacity), else_=0.0),
+    ).group_by(sources.c.origin, sources.c.destination)
+    columns = ['origin', 'destination', 'flights'] + CLASS_COLUMNS + ['capacity', 'seats_sold', 'load_factor']
+
+    if routes is None:
+        db.session.execute(delete(RouteStats))
+        db.session.execute(insert(RouteStats).from_select(columns, rollup))
+        return
+
+    for start in range(0, len(routes), STATS_CHUNK_SIZE):
+        chunk = routes[start:start + STATS_CHUNK_SIZE]
+        db.session.execute(delete(RouteStats).where(tuple_(RouteStats.origin, RouteStats.destination).in_(chunk)))
+        db.session.execute(insert(RouteStats).from_select(
+            columns, rollup.where(tuple_(sources.c.origin, sources.c.destination).in_(chunk))))
+
+
+def refresh_totals():
+    """Sum RouteStats into the single AnalyticsTotals row."""
+    db.session.execute(delete(AnalyticsTotals))
+    db.session.execute(insert(AnalyticsTotals).from_select(
+        ['id', 'flights'] + CLASS_COLUMNS,
+        select(literal(1), *(func.coalesce(func.sum(getattr(RouteStats, name)), 0)
+                             for name in ['flights'] + CLASS_COLUMNS)),
+    ))
+
+
+def archive_flight_stats(flight_ids):
+    """Fold the stats of flights about to be archived into ArchivedRouteStats.
+
+    Called by the archive job in its own transaction, before the flights and
+    their bookings leave the live tables. The caller is responsible for
+    committing.
+    """
+    # Bring the flights' stats up to date while they can still be computed
+    routes = refresh_flight_stats(flight_ids)
+    archived = db.session.execute(
+        select(FlightStats.origin, FlightStats.destination, func.count(FlightStats.flight_id),
+               *(func.sum(getattr(FlightStats, name)) for name in CLASS_COLUMNS))
+        .where(FlightStats.flight_id.in_(flight_ids))
+        .group_by(FlightStats.origin, FlightStats.destination)
+    ).all()
+
+    for origin, destination, flights, *values in archived:
+        added = dict(zip(CLASS_COLUMNS, values), flights=flights)
+        updated = db.session.execute(
+            update(ArchivedRouteStats)
+            .where(ArchivedRouteStats.origin == origin, ArchivedRouteStats.destination == destination)
+            .values({name: getattr(ArchivedRouteStats, name) + value for name, value in added.items()})
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            db.session.execute(insert(ArchivedRouteStats).values(origin=origin, destination=destination, **added))
+
+    db.session.execute(delete(FlightStats).where(FlightStats.flight_id.in_(flight_ids)))
+    refresh_route_stats(routes)
+    refresh_totals()
+
+
+def refresh_booking_pace(days, now=None):
+    """Recount bookings per day and class for the last ``days`` days."""
+    now = now or datetime.utcnow()
+    since = datetime.combine(now.date() - timedelta(days=days - 1), datetime.min.time())
+    db.session.execute(delete(BookingPace).where(BookingPace.day >= since.date()))
+    day = func.date(Booking.booking_date)
+    db.session.execute(insert(BookingPace).from_select(
+        ['day', 'travel_class', 'bookings', 'revenue'],
+        select(day, Booking.travel_class, func.count(Booking.id), func.sum(Booking.price_paid))
+        .where(Booking.booking_date >= since, Booking.status == 'Confirmed')
+        .group_by(day, Booking.travel_class),
+    ))
+    # Days that slid out of the window
+    db.session.execute(delete(BookingPace).where(BookingPace.day < since.date()))
+
+
+def refresh_analytics(pace_days=7, full=False):
+    """Fold flight changes since the watermark into the summary tables.
+
+    Rebuilds everything when ``full`` is set, on the first run, or when the
+    changes since the watermark have been pruned from the log. Returns the
+    number of flights recomputed, or None if another refresh got there first.
+    """
+    watermark = db.session.get(AnalyticsWatermark, WATERMARK)
+    if watermark is None:
+        try:
+            watermark = AnalyticsWatermark(name=WATERMARK, version=0)
+            db.session.add(watermark)
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            return None
+
+    start = watermark.version
+    latest = current_flight_data_version()
+    if latest == start and not full:
+        return 0
+    oldest = db.session.scalar(select(func.min(FlightChange.version))) or 0
+    full = full or start == 0 or start < oldest - 1 or latest < start
+
+    target = latest
+    if full:
+        flight_ids = set(db.session.scalars(select(Flight.id)))
+        flight_ids.update(db.session.scalars(select(FlightStats.flight_id)))
+    else:
+        flight_ids = set(db.session.scalars(
+            select(FlightChange.flight_id).where(FlightChange.version > start, FlightChange.version <= target).distinct()
+        ))
+
+    # Claim the range; a concurrent refresh that moved the watermark wins
+    claimed = db.session.execute(
+        update(AnalyticsWatermark)
+        .where(AnalyticsWatermark.name == WATERMARK, AnalyticsWatermark.version == start)
+        .values(version=target, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        return None
+
+    try:
+        routes = refresh_flight_stats(sorted(flight_ids))
+        refresh_route_stats(None if full else routes)
+        refresh_totals()
+        refresh_booking_pace(pace_days)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    db.session.expire(watermark)
+    logger.info("Analytics refreshed %d flights up to version %d%s", len(flight_ids), target,
+                " (full rebuild)" if full else "")
+    return len(flight_ids)
+
+
+def _pace_series(days, now=None):
+    # Daily bookings and revenue per class, zero-filled, oldest day first
+    now = now or datetime.utcnow()
+    first_day = now.date() - timedelta(days=days - 1)
+    rows = db.session.execute(
+        select(BookingPace.day, BookingPace.travel_class, BookingPace.bookings, BookingPace.revenue)
+        .where(BookingPace.day >= first_day)
+    ).all()
+
+    bookings = np.zeros((len(TRAVEL_CLASSES), days), dtype=np.int64)
+    revenue = np.zeros((len(TRAVEL_CLASSES), days))
+    for day, travel_class, count, total in rows:
+        offset = (day - first_day).days
+        if travel_class in TRAVEL_CLASSES and 0 <= offset < days:
+            bookings[TRAVEL_CLASSES.index(travel_class), offset] = count
+            revenue[TRAVEL_CLASSES.index(travel_class), offset] = total
+
+    daily = bookings.sum(axis=0)
+    return {
+        'days': [(first_day + timedelta(days=i)).isoformat() for i in range(days)],
+        'bookings': {c: bookings[i].tolist() for i, c in enumerate(TRAVEL_CLASSES)},
+        'revenue': {c: np.round(revenue[i], 2).tolist() for i, c in enumerate(TRAVEL_CLASSES)},
+        'total_bookings': daily.tolist(),
+        'average_per_day': round(float(daily.mean()), 2) if days else 0.0,
+    }
+
+
+def _totals():
+    totals = db.session.get(AnalyticsTotals, 1)
+    values = np.array([getattr(totals, name) if totals else 0 for name in CLASS_COLUMNS], dtype=np.float64)
+    capacity, sold, revenue = values.reshape(3, len(TRAVEL_CLASSES))
+    load = np.divide(sold, capacity, out=np.zeros_like(capacity), where=capacity > 0)
+    return {
+        'flights': totals.flights if totals else 0,
+        'load_factor': round(float(sold.sum() / capacity.sum()), 4) if capacity.sum() else 0.0,
+        'revenue': round(float(revenue.sum()), 2),
+        'by_class': {
+            c: {
+                'capacity': int(capacity[i]),
+                'seats_sold': int(sold[i]),
+                'load_factor': round(float(load[i]), 4),
+                'revenue': round(float(revenue[i]), 2),
+            }
+            for i, c in enumerate(TRAVEL_CLASSES)
+        },
+    }
+
+
+def analytics_summary(limit=20, pace_days=7, ascending=False):
+    """Dashboard payload read from the summary tables."""
+    order = RouteStats.load_factor.asc() if ascending else RouteStats.load_factor.desc()
+    routes = db.session.execute(select(RouteStats).order_by(order, RouteStats.origin).limit(limit)).scalars()
+
+    flight_order = FlightStats.load_factor.asc() if ascending else FlightStats.load_factor.desc()
+    flights = db.session.execute(
+        select(FlightStats)
+        .where(FlightStats.departure_time > datetime.now())
+        .order_by(flight_order, FlightStats.departure_time)
+        .limit(limit)
+    ).scalars()
+
+    watermark = db.session.get(AnalyticsWatermark, WATERMARK)
+    as_of = watermark.version if watermark else 0
+    return {
+        'as_of_version': as_of,
+        'pending_changes': db.session.scalar(select(func.count(FlightChange.id)).where(FlightChange.version > as_of)),
+        'updated_at': watermark.updated_at.isoformat() if watermark and watermark.updated_at else None,
+        'totals': _totals(),
+        'routes': [
+            {
+                'origin': r.origin,
+                'destination': r.destination,
+                'flights': r.flights,
+                'capacity': r.capacity,
+                'seats_sold': r.seats_sold,
+                'load_factor': round(r.load_factor, 4),
+                'revenue': {c: getattr(r, f'revenue_{c}') for c in TRAVEL_CLASSES},
+            }
+            for r in routes
+        ],
+        'flights': [
+            {
+                'id': f.flight_id,
+                'flight_number': f.flight_number,
+                'origin': f.origin,
+                'destination': f.destination,
+                'departure_time': f.departure_time.isoformat(),
+                'status': f.status,
+                'load_factor': f.load_factor,
+                'seats_sold': {c: getattr(f, f'sold_{c}') for c in TRAVEL_CLASSES},
+                'capacity': {c: getattr(f, f'capacity_{c}') for c in TRAVEL_CLASSES},
+                'revenue': {c: getattr(f, f'revenue_{c}') for c in TRAVEL_CLASSES},
+            }
+            for f in flights
+        ],
+        'booking_pace': _pace_series(pace_days),
+    }
+
+
+def start_analytics_scheduler(app, interval):
+    # Same pattern as the pricing scheduler; concurrent refreshes from other
+    # workers are resolved by the watermark claim
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    refresh_analytics(app.config['ANALYTICS_PACE_DAYS'])
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Scheduled analytics refresh failed")
+
+    thread = threading.Thread(target=run, name='analytics-scheduler', daemon=True)
+    thread.start()
+    return thread
+
+
+def register_analytics(app):
+    @app.route('/admin/analytics')
+    @operator_required
+    def analytics_dashboard():
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 500)
+        ascending = request.args.get('order') == 'asc'
+        return jsonify(analytics_summary(limit, app.config['ANALYTICS_PACE_DAYS'], ascending))
+
+    @app.cli.command('refresh-analytics')
+    @click.option('--full', is_flag=True, help='Rebuild every summary table from scratch.')
+    def refresh_analytics_command(full):
+        """Fold pending flight changes into the analytics summary tables."""
+        start = time.perf_counter()
+        flights = refresh_analytics(app.config['ANALYTICS_PACE_DAYS'], full=full)
+        click.echo(f"Recomputed analytics for {flights or 0} flights in {time.perf_counter() - start:.2f}s")
+
+    interval = app.config.get('ANALYTICS_REFRESH_SECONDS', 0)
+    if interval > 0:
+        start_analytics_scheduler(app, interval)
@@ -0,0 +1,191 @@
+"""Versioned JSON API (``/api/v1``) for flights, search and bookings.
+
+Flights are serialised through ``schemas.FLIGHT_SCHEMA`` once per flight
+version: the encoded bytes are cached under the record's (id, version), so
+an updated flight gets a new key and list responses are
+assembled by joining cached payloads instead of re-encoding every flight.
+Responses are gzip- or brotli-compressed when the client accepts it.
+Unauthenticated requests get a JSON 401 rather than the login page redirect.
+"""
+import gzip
+from functools import wraps
+
+from flask import Response, request
+from flask_login import current_user
+from sqlalchemy import select
+
+from app import db
+from cache import LRUCache
+from encoding import negotiate_encoding
+from models import Booking
+from schemas import BOOKING_SCHEMA, FLIGHT_SCHEMA, dumps, join_array, join_object
+from search import search_flights
+from snapshot import snapshot
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+API_PREFIX = '/api/v1'
+
+MAX_PAGE_SIZE = 500
+
+class PayloadCache:
+    """Encoded flight payloads keyed by (flight id, flight version)."""
+
+    def __init__(self):
+        self.payloads = LRUCache()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, max_entries, max_bytes):
+        self.payloads = LRUCache(max_entries, max_bytes)
+
+    def flight(self, record):
+        key = (record.id, record.version)
+        payload = self.payloads.get(key)
+        if payload is None:
+            self.misses += 1
+            payload = dumps(FLIGHT_SCHEMA.dump(record))
+            self.payloads.set(key, payload)
+        else:
+            self.hits += 1
+        return payload
+
+    def flights(self, records):
+        return join_array([self.flight(record) for record in records])
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self.payloads),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+payload_cache = PayloadCache()
+
+
+def json_response(body, status=200, min_compress_bytes=1024):
+    """Wrap encoded JSON bytes in a response, compressed if the client accepts it."""
+    headers = {'Vary': 'Accept-Encoding'}
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding')) if len(body) >= min_compress_bytes else None
+    if encoding == 'br':
+        body = brotli.compress(body, quality=5)
+    elif encoding == 'gzip':
+        body = gzip.compress(body, compresslevel=5)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, status=status, mimetype='application/json', headers=headers)
+
+
+def api_login_required(view):
+    """Like ``login_required``, but answers anonymous clients with a JSON 401."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return json_response(dumps({'error': 'Authentication required.'}), 401)
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def register_api(app):
+    payload_cache.configure(app.config['API_PAYLOAD_CACHE_MAX_ENTRIES'], app.config['API_PAYLOAD_CACHE_MAX_BYTES'])
+    min_compress_bytes = app.config['API_COMPRESS_MIN_BYTES']
+
+    def respond(body, status=200):
+        return json_response(body, status, min_compress_bytes)
+
+    def error(message, status):
+        return respond(dumps({'error': message}), status)
+
+    def page_args():
+        limit = request.args.get('limit', 100, type=int)
+        offset = request.args.get('offset', 0, type=int)
+        return min(max(limit, 1), MAX_PAGE_SIZE), max(offset, 0)
+
+    @app.route(f'{API_PREFIX}/flights')
+    @api_login_required
+    def api_flights():
+        origin = request.args.get('origin', '').strip() or None
+        destination = request.args.get('destination', '').strip() or None
+        status = request.args.get('status', '').strip() or None
+        limit, offset = page_args()
+
+        records = snapshot.find(origin, destination) if origin or destination else snapshot.all()
+        if status:
+            records = [record for record in records if record.status == status]
+        records.sort(key=lambda record: (record.departure_time, record.id))
+
+        return respond(join_object(
+            count=dumps(len(records)),
+            limit=dumps(limit),
+            offset=dumps(offset),
+            flights=payload_cache.flights(records[offset:offset + limit]),
+        ))
+
+    @app.route(f'{API_PREFIX}/flights/<int:flight_id>')
+    @api_login_required
+    def api_flight(flight_id):
+        record = snapshot.get(flight_id)
+        if record is None:
+            return error('Flight not found.', 404)
+        return respond(payload_cache.flight(record))
+
+    @app.route(f'{API_PREFIX}/search')
+    @api_login_required
+    def api_search():
+        origin = request.args.get('origin', '').strip()
+        destination = request.args.get('destination', '').strip()
+        if not origin or not destination:
+            return error('Pass "origin" and "destination".', 400)
+
+        direct, connections, complete = search_flights(origin, destination)
+        connection_payloads = [
+            join_object(
+                first_leg=payload_cache.flight(connection['first_leg']),
+                second_leg=payload_cache.flight(connection['second_leg']),
+                connection_hours=dumps(round(connection['connection_time'], 2)),
+                total_duration_hours=dumps(round(connection['total_duration'], 2)),
+                total_prices=dumps({
+                    'economy': round(connection['total_price_economy'], 2),
+                    'premium': round(connection['total_price_premium'], 2),
+                    'business': round(connection['total_price_business'], 2),
+                }),
+            )
+            for connection in connections
+        ]
+        return respond(join_object(
+            direct=payload_cache.flights(direct),
+            connections=join_array(connection_payloads),
+            complete=dumps(complete),
+        ))
+
+    @app.route(f'{API_PREFIX}/bookings')
+    @api_login_required
+    def api_bookings():
+        limit, offset = page_args()
+        bookings = db.session.scalars(
+            select(Booking)
+            .where(Booking.user_id == current_user.id)
+            .order_by(Booking.booking_date.desc(), Booking.id.desc())
+            .limit(limit)
+            .offset(offset)
+        ).all()
+
+        payloads = []
+        for booking in bookings:
+            flight = snapshot.get(booking.flight_id)
+            payloads.append(join_object(
+                booking=dumps(BOOKING_SCHEMA.dump(booking)),
+                flight=payload_cache.flight(flight) if flight is not None else b'null',
+            ))
+        return respond(join_object(
+            limit=dumps(limit),
+            offset=dumps(offset),
+            bookings=join_array(payloads),
+        ))
@@ -37,6 +37,56 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 }
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Operators: comma-separated emails of the users allowed to use admin and
+# operational endpoints, and a bearer token for API clients (unset disables it)
+app.config["OPERATOR_EMAILS"] = {
+    email.strip().lower() for email in os.environ.get("OPERATOR_EMAILS", "").split(",") if email.strip()
+}
+app.config["OPERATOR_API_TOKEN"] = os.environ.get("OPERATOR_API_TOKEN")
+
+# Dynamic pricing: reprice all flights every N seconds (0 disables the scheduler)
+app.config["PRICING_INTERVAL_SECONDS"] = int(os.environ.get("PRICING_INTERVAL_SECONDS", "0"))
+
+# Live flight feed (Server-Sent Events). Each open stream holds a worker
+# thread, so only enable it when gunicorn runs threaded or gevent workers
+app.config["LIVE_FEED_ENABLED"] = os.environ.get("LIVE_FEED_ENABLED", "").lower() in ("1", "true", "yes")
+app.config["LIVE_FEED_POLL_SECONDS"] = 1.0
+app.config["LIVE_FEED_HEARTBEAT_SECONDS"] = 15
+app.config["LIVE_FEED_MAX_SECONDS"] = 300
+app.config["LIVE_FEED_MAX_FLIGHTS"] = 500
+
+# Rendered fragment cache; set FRAGMENT_CACHE_DIR to share entries on disk
+app.config["FRAGMENT_CACHE_MAX_ENTRIES"] = 512
+app.config["FRAGMENT_CACHE_MAX_BYTES"] = 64 * 1024 * 1024
+app.config["FRAGMENT_CACHE_DIR"] = os.environ.get("FRAGMENT_CACHE_DIR")
+app.config["FLIGHT_CHANGE_LOG_RETENTION"] = 100000
+
+# Search result cache (per worker)
+app.config["SEARCH_CACHE_MAX_ENTRIES"] = 2048
+
+# Connecting searches: per-search deadline and result cap; searches with at
+# least SEARCH_OFFLOAD_MIN_PAIRS candidate pairs run in a process pool
+# (0 workers keeps every search inline)
+app.config["SEARCH_DEADLINE_SECONDS"] = 2.0
+app.config["SEARCH_MAX_CONNECTIONS"] = 200
+app.config["SEARCH_OFFLOAD_MIN_PAIRS"] = 20000
+app.config["SEARCH_POOL_WORKERS"] = int(os.environ.get("SEARCH_POOL_WORKERS", "2"))
+app.config["SEARCH_TIMETABLE_DIR"] = os.environ.get("SEARCH_TIMETABLE_DIR")
+
+# Archival of departed flights and their bookings
+app.config["ARCHIVE_AFTER_DAYS"] = int(os.environ.get("ARCHIVE_AFTER_DAYS", "30"))
+app.config["ARCHIVE_CHUNK_SIZE"] = 500
+
+# Analytics summary tables: refresh every N seconds in the background (0
+# disables the scheduler; run `flask refresh-analytics` instead)
+app.config["ANALYTICS_REFRESH_SECONDS"] = int(os.environ.get("ANALYTICS_REFRESH_SECONDS", "0"))
+app.config["ANALYTICS_PACE_DAYS"] = 7
+
+# JSON API: cached per-flight payloads and response compression threshold
+app.config["API_PAYLOAD_CACHE_MAX_ENTRIES"] = 20000
+app.config["API_PAYLOAD_CACHE_MAX_BYTES"] = 32 * 1024 * 1024
+app.config["API_COMPRESS_MIN_BYTES"] = 1024
+
 # Initialize Flask extensions
 db.init_app(app)
 
@@ -49,14 +99,56 @@ login_manager.login_message_category = 'info'
 
 with app.app_context():
     # Import models here to avoid circular imports
-    from models import User, Flight, Booking
+    from models import (User, Flight, Booking, FareBasis, ScheduledJob, FlightChange, FlightDataVersion,
+                        FlightArchive, BookingArchive, FlightStats, RouteStats,
+                        ArchivedRouteStats, AnalyticsTotals, BookingPace, AnalyticsWatermark)
     
     # Create database tables
     db.create_all()
     
+    # Configure the fragment cache and start tracking flight changes
+    from cache import register_cache
+    register_cache(app)
+    
     # Import and register routes
     from routes import register_routes
     register_routes(app)
+
+    # Register the pricing engine CLI command and scheduler
+    from pricing import register_pricing
+    register_pricing(app)
+
+    # Register the live flight feed and bulk status API
+    from events import register_events
+    register_events(app)
+
+    # Register operational flight cancellation
+    from cancellations import register_cancellations
+    register_cancellations(app)
+
+    # Register the search result cache statistics endpoint
+    from search import register_search
+    register_search(app)
+
+    # Register the flight archival job
+    from archive import register_archive
+    register_archive(app)
+
+    # Register passenger manifest and bookings exports
+    from exports import register_exports
+    register_exports(app)
+
+    # Register route and load-factor analytics
+    from analytics import register_analytics
+    register_analytics(app)
+
+    # Register the versioned JSON API
+    from api import register_api
+    register_api(app)
+
+    # Serve fingerprinted, precompressed static assets when they have been built
+    from assets import register_assets
+    register_assets(app)
     
     @login_manager.user_loader
     def load_user(user_id):
@@ -0,0 +1,138 @@
+"""Hot/cold archival of departed flights.
+
+Flights that departed more than ``ARCHIVE_AFTER_DAYS`` days ago are moved,
+together with their bookings, from the live ``flight``/``booking`` tables into
+``flight_archive``/``booking_archive``. The job works in chunks of
+``ARCHIVE_CHUNK_SIZE`` flights, each chunk copied with INSERT ... SELECT and
+removed with set-based DELETEs in its own transaction, so it never holds
+long locks and can be stopped and resumed at any point.
+
+Live pages only see the hot tables; past trips are read from the archive on
+demand by the booking history page. Archived rows keep their live ids in
+``id``, but those can repeat (SQLite reuses the ids of deleted rows), so the
+archive tables have their own ``archive_id`` keys and archived bookings point
+at their flight through ``flight_archive_id``.
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import delete, func, insert, literal, select
+
+from analytics import archive_flight_stats
+from app import db
+from cache import record_flight_changes
+from models import Booking, BookingArchive, FareBasis, Flight, FlightArchive
+
+logger = logging.getLogger(__name__)
+
+_FLIGHT_COLUMNS = [
+    'id', 'flight_number', 'origin', 'destination', 'departure_time', 'arrival_time',
+    'status', 'economy_price', 'premium_price', 'business_price',
+    'available_seats_economy', 'available_seats_premium', 'available_seats_business',
+    'aircraft_type', 'distance_km',
+]
+
+_BOOKING_COLUMNS = [
+    'id', 'user_id', 'flight_id', 'booking_date', 'travel_class', 'seat_number',
+    'price_paid', 'passenger_name', 'passenger_age', 'passenger_gender',
+    'contact_number', 'status',
+]
+
+
+def archive_flight_chunk(flight_ids, archived_at):
+    """Move the given flights and their bookings into the archive tables.
+
+    The caller is responsible for committing.
+    """
+    in_chunk = Flight.id.in_(flight_ids)
+
+    # Log the change first, while the flights' routes can still be read, and
+    # keep their load factor and revenue in the analytics route totals
+    record_flight_changes(in_chunk)
+    archive_flight_stats(flight_ids)
+
+    db.session.execute(
+        insert(FlightArchive).from_select(
+            _FLIGHT_COLUMNS + ['archived_at'],
+            select(*(getattr(Flight, name) for name in _FLIGHT_COLUMNS), literal(archived_at))
+            .where(in_chunk),
+        )
+    )
+    # Link each booking to the archive row just written for its flight, the
+    # newest one with that live id
+    flight_archive_id = (
+        select(func.max(FlightArchive.archive_id))
+        .where(FlightArchive.id == Booking.flight_id)
+        .scalar_subquery()
+    )
+    bookings = db.session.execute(
+        insert(BookingArchive).from_select(
+            _BOOKING_COLUMNS + ['flight_archive_id', 'archived_at'],
+            select(*(getattr(Booking, name) for name in _BOOKING_COLUMNS), flight_archive_id, literal(archived_at))
+            .where(Booking.flight_id.in_(flight_ids)),
+        )
+    ).rowcount
+
+    db.session.execute(
+        delete(Booking).where(Booking.flight_id.in_(flight_ids))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        delete(FareBasis).where(FareBasis.flight_id.in_(flight_ids))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(delete(Flight).where(in_chunk).execution_options(synchronize_session=False))
+    return bookings
+
+
+def archive_departed_flights(days, chunk_size, max_chunks=None):
+    """Archive flights that departed more than ``days`` days ago.
+
+    Returns (flights archived, bookings archived).
+    """
+    cutoff = datetime.now() - timedelta(days=days)
+    flights = bookings = chunks = 0
+
+    while max_chunks is None or chunks < max_chunks:
+        # Lock the chunk's flights: book_flight takes the same lock, so no
+        # booking can commit between copying the bookings and deleting them
+        flight_ids = db.session.scalars(
+            select(Flight.id)
+            .where(Flight.departure_time < cutoff)
+            .order_by(Flight.id)
+            .limit(chunk_size)
+            .with_for_update()
+        ).all()
+        if not flight_ids:
+            break
+
+        try:
+            bookings += archive_flight_chunk(flight_ids, datetime.utcnow())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        flights += len(flight_ids)
+        chunks += 1
+
+    return flights, bookings
+
+
+def register_archive(app):
+    @app.cli.command('archive-flights')
+    @click.option('--days', type=int, default=None,
+                  help='Archive flights that departed more than this many days ago.')
+    @click.option('--chunk-size', type=int, default=None, help='Flights moved per transaction.')
+    @click.option('--max-chunks', type=int, default=None, help='Stop after this many chunks.')
+    def archive_flights_command(days, chunk_size, max_chunks):
+        """Move departed flights and their bookings into the archive tables."""
+        start = time.perf_counter()
+        flights, bookings = archive_departed_flights(
+            app.config['ARCHIVE_AFTER_DAYS'] if days is None else days,
+            chunk_size or app.config['ARCHIVE_CHUNK_SIZE'],
+            max_chunks,
+        )
+        logger.info("Archived %d flights and %d bookings", flights, bookings)
+        click.echo(f"Archived {flights} flights and {bookings} bookings in {time.perf_counter() - start:.2f}s")
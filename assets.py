@@ -0,0 +1,228 @@
+"""Static asset pipeline.
+
+``flask build-assets`` copies every file under ``static/`` (plus the app
+icon) into ``static/dist/`` under a content-hashed name, writes gzip and,
+when the ``brotli`` package is installed, brotli variants of text assets,
+and, when Pillow is installed, optimised and resized image variants. The
+mapping from logical to hashed names goes into ``static/dist/manifest.json``.
+
+At startup the manifest is loaded and a ``url_defaults`` hook points
+``url_for('static', filename=...)`` at the hashed file, so templates keep
+using logical names. Hashed files are served with the best precompressed
+encoding the client accepts and an immutable Cache-Control header. Without
+a manifest, static files are served as before. Rebuild and restart after
+changing assets.
+"""
+import gzip
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+
+import click
+from flask import request, send_from_directory
+
+from encoding import negotiate_encoding
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Files outside static/ that are published as assets: logical name -> path
+# relative to the app root
+EXTRA_SOURCES = {'img/icon.png': 'generated-icon.png'}
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.json', '.svg', '.txt', '.html', '.map'}
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+
+# Square icon sizes for the app icon, widths for other images
+ICON_SIZES = (32, 180, 192, 512)
+IMAGE_WIDTHS = (320, 640, 1280)
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Extension of each precompressed variant, best first
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def hashed_name(name, data):
+    stem, extension = os.path.splitext(name)
+    return f'{stem}.{content_hash(data)}{extension}'
+
+
+def _compressed_variants(data):
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    # A variant that doesn't save anything is not worth negotiating
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+def _image_variants(name, data):
+    """Optimised copy and resized variants of an image: logical name -> bytes."""
+    if Image is None:
+        return {name: data}
+
+    stem, extension = os.path.splitext(name)
+    image_format = 'PNG' if extension.lower() == '.png' else 'JPEG'
+    options = {'optimize': True} if image_format == 'PNG' else {'optimize': True, 'quality': 85, 'progressive': True}
+
+    def encode(image):
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, **options)
+        return buffer.getvalue()
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        optimised = encode(image)
+        variants = {name: optimised if len(optimised) < len(data) else data}
+        if name in EXTRA_SOURCES and image.width == image.height:
+            sizes = [(size, size) for size in ICON_SIZES if size < image.width]
+        else:
+            sizes = [(width, round(image.height * width / image.width)) for width in IMAGE_WIDTHS if width < image.width]
+        for size in sizes:
+            variants[f'{stem}-{size[0]}{extension}'] = encode(image.resize(size, Image.LANCZOS))
+    return variants
+
+
+def _sources(app):
+    static = app.static_folder
+    for root, dirs, files in os.walk(static):
+        if root == static:
+            # Skip build output, including staging and old builds
+            dirs[:] = [d for d in dirs if not d.startswith((DIST_DIR, '.'))]
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            yield os.path.relpath(path, static).replace(os.sep, '/'), path
+    for name, path in EXTRA_SOURCES.items():
+        path = os.path.join(app.root_path, path)
+        if os.path.isfile(path):
+            yield name, path
+
+
+def build_assets(app):
+    """Build static/dist and its manifest; returns the manifest."""
+    dist = os.path.join(app.static_folder, DIST_DIR)
+    staging = tempfile.mkdtemp(prefix='.dist-', dir=app.static_folder)
+    files = {}
+    try:
+        for name, path in _sources(app):
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            extension = os.path.splitext(name)[1].lower()
+            outputs = _image_variants(name, data) if extension in IMAGE_EXTENSIONS else {name: data}
+            for logical, body in outputs.items():
+                target = hashed_name(logical, body)
+                encodings = _compressed_variants(body) if extension in COMPRESSIBLE_EXTENSIONS else {}
+                written = {target: body}
+                written.update({target + ENCODING_SUFFIXES[encoding]: variant for encoding, variant in encodings.items()})
+                for relative, content in written.items():
+                    out = os.path.join(staging, relative)
+                    os.makedirs(os.path.dirname(out), exist_ok=True)
+                    with open(out, 'wb') as f:
+                        f.write(content)
+                files[logical] = {
+                    'path': target,
+                    'size': len(body),
+                    'encodings': {encoding: len(variant) for encoding, variant in encodings.items()},
+                }
+
+        manifest = {'files': dict(sorted(files.items()))}
+        with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        # Swap the new build in
+        if os.path.isdir(dist):
+            old = dist + '.old'
+            shutil.rmtree(old, ignore_errors=True)
+            os.rename(dist, old)
+            os.rename(staging, dist)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.rename(staging, dist)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return manifest
+
+
+def load_manifest(app):
+    path = os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)['files']
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, KeyError):
+        logger.exception("Ignoring unreadable asset manifest %s", path)
+        return {}
+
+
+def register_assets(app):
+    manifest = load_manifest(app)
+    # Hashed path under dist/ -> encodings available for it
+    hashed = {f"{DIST_DIR}/{entry['path']}": tuple(e for e in ENCODING_SUFFIXES if e in entry['encodings'])
+              for entry in manifest.values()}
+    if manifest:
+        logger.info("Serving %d fingerprinted static assets", len(manifest))
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = f"{DIST_DIR}/{manifest[values['filename']]['path']}"
+
+    @app.context_processor
+    def asset_helpers():
+        return {'has_static_asset': lambda name: name in manifest}
+
+    serve_static = app.view_functions['static']
+
+    def static(filename):
+        encodings = hashed.get(filename)
+        if encodings is None:
+            return serve_static(filename=filename)
+
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'), encodings) if encodings else None
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(app.static_folder, filename + ENCODING_SUFFIXES[encoding] if encoding else filename,
+                                       mimetype=mimetype, max_age=31536000, conditional=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if encodings:
+            response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    app.view_functions['static'] = static
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Fingerprint, precompress and resize static assets into static/dist."""
+        files = build_assets(app)['files']
+        variants = sum(len(entry['encodings']) for entry in files.values())
+        click.echo(f"Built {len(files)} assets and {variants} compressed variants in "
+                   f"{os.path.join(app.static_folder, DIST_DIR)}")
+        if brotli is None:
+            click.echo("brotli is not installed; only gzip variants were written")
+        if Image is None:
+            click.echo("Pillow is not installed; images were copied without resizing")
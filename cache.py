@@ -0,0 +1,342 @@
+"""Flight change tracking and rendered fragment cache.
+
+Every write to a flight appends a row to ``FlightChange``: ORM writes are
+picked up by a session ``after_flush`` hook, and bulk UPDATE statements call
+``record_flight_changes`` themselves. Just before such a transaction commits
+it bumps the single ``FlightDataVersion`` row and stamps its log rows with
+the new value. The bump holds that row's lock until commit, so versions are
+handed out in commit order: once a version is visible, every change at or
+below it is too, and readers can safely ask for changes above the version
+they last saw. Log ids make no such promise on PostgreSQL, where a
+transaction can take id N and commit after N + 1.
+
+The current version is the flight table's version, and the newest version
+among one flight's log rows is that flight's version. Rendered HTML
+fragments are cached under keys that include those versions, so a changed
+flight simply produces a new key and stale entries age out of the LRU
+without explicit invalidation.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import click
+from flask import g, render_template
+from markupsafe import Markup
+from sqlalchemy import delete, event, func, insert, literal, select, update
+
+from app import db
+from models import Flight, FlightChange, FlightDataVersion
+
+logger = logging.getLogger(__name__)
+
+# Bulk writers pass flight ids in chunks to keep the IN lists reasonable
+CHANGE_CHUNK_SIZE = 500
+
+# Session.info key set while a transaction has unstamped change log rows
+_PENDING_CHANGES = 'flight_changes_pending'
+
+
+# Change tracking
+
+def record_flight_changes(*criteria):
+    """Log a change for every flight matching ``criteria`` with one INSERT ... SELECT.
+
+    Call this from code that modifies flights with bulk UPDATE statements,
+    which bypass the ORM flush hook.
+    """
+    now = datetime.utcnow()
+    db.session.info[_PENDING_CHANGES] = True
+    db.session.execute(
+        insert(FlightChange).from_select(
+            ['flight_id', 'origin', 'destination', 'changed_at'],
+            select(Flight.id, Flight.origin, Flight.destination, literal(now)).where(*criteria),
+        )
+    )
+
+
+def record_flight_changes_by_id(flight_ids):
+    flight_ids = list(flight_ids)
+    for start in range(0, len(flight_ids), CHANGE_CHUNK_SIZE):
+        record_flight_changes(Flight.id.in_(flight_ids[start:start + CHANGE_CHUNK_SIZE]))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _log_flushed_flight_changes(session, flush_context):
+    rows = []
+    now = datetime.utcnow()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Flight):
+            continue
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        rows.append({
+            'flight_id': obj.id,
+            'origin': obj.origin,
+            'destination': obj.destination,
+            'changed_at': now,
+        })
+    if rows:
+        session.info[_PENDING_CHANGES] = True
+        session.connection().execute(insert(FlightChange.__table__), rows)
+
+
+@event.listens_for(db.session, 'before_commit')
+def _stamp_flight_changes(session):
+    # Flush first so that changes logged by the final flush are stamped too
+    session.flush()
+    if not session.info.pop(_PENDING_CHANGES, False):
+        return
+
+    connection = session.connection()
+    bumped = connection.execute(
+        update(FlightDataVersion).where(FlightDataVersion.id == 1).values(version=FlightDataVersion.version + 1)
+    ).rowcount
+    if not bumped:
+        # First flight write on a new database
+        connection.execute(insert(FlightDataVersion).values(
+            id=1, version=select(func.coalesce(func.max(FlightChange.version), 0) + 1).scalar_subquery(),
+        ))
+    version = connection.scalar(select(FlightDataVersion.version).where(FlightDataVersion.id == 1))
+    # Unstamped rows are this transaction's own; other writers' are not visible
+    connection.execute(update(FlightChange).where(FlightChange.version.is_(None)).values(version=version))
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_flight_changes(session):
+    session.info.pop(_PENDING_CHANGES, None)
+
+
+def current_flight_data_version():
+    return db.session.scalar(select(FlightDataVersion.version).where(FlightDataVersion.id == 1)) or 0
+
+
+def flight_data_version():
+    """Return the flight table's version, memoised for the request."""
+    if 'flight_data_version' not in g:
+        g.flight_data_version = current_flight_data_version()
+    return g.flight_data_version
+
+
+def flight_version(flight_id):
+    """Return the version at which a single flight last changed.
+
+    Flights whose log rows were pruned fall back to the pruning watermark,
+    which is still greater than or equal to their last change's version.
+    """
+    return db.session.scalar(
+        select(func.coalesce(
+            select(func.max(FlightChange.version))
+            .where(FlightChange.flight_id == flight_id)
+            .scalar_subquery(),
+            select(func.min(FlightChange.version) - 1).scalar_subquery(),
+            0,
+        ))
+    )
+
+
+def prune_flight_changes(keep):
+    """Delete change log rows older than the newest ``keep``.
+
+    Whole versions are kept or deleted, so a reader never sees part of one.
+    """
+    cutoff = db.session.scalar(
+        select(FlightChange.version)
+        .where(FlightChange.version.is_not(None))
+        .order_by(FlightChange.version.desc())
+        .offset(max(keep, 1) - 1)
+        .limit(1)
+    )
+    if cutoff is None:
+        return 0
+    result = db.session.execute(delete(FlightChange).where(FlightChange.version < cutoff))
+    return result.rowcount
+
+
+# Fragment cache
+
+class LRUCache:
+    """Thread-safe in-memory LRU bounded by entry count and total size.
+
+    ``sizeof`` measures an entry; the default suits bytes and strings.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=64 * 1024 * 1024, sizeof=len):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= self.sizeof(old)
+            self._entries[key] = value
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= self.sizeof(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache:
+    """Directory of cache files, shared by every worker on the machine.
+
+    Files are written atomically and the oldest ones are removed once the
+    directory holds more than ``max_entries`` files.
+    """
+
+    def __init__(self, directory, max_entries=4096):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            logger.exception("Could not write fragment cache file")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+
+        # Checking the directory size on every write would be wasteful
+        self._writes += 1
+        if self._writes % 64 == 0:
+            self.evict()
+
+    def evict(self):
+        try:
+            entries = [entry for entry in os.scandir(self.directory)
+                       if entry.is_file() and not entry.name.startswith('.tmp-')]
+        except OSError:
+            return
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                os.unlink(entry.path)
+
+
+class FragmentCache:
+    """Two-level cache of rendered HTML: memory LRU in front of optional disk."""
+
+    def __init__(self):
+        self.memory = LRUCache()
+        self.disk = None
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, max_entries, max_bytes, directory=None):
+        self.memory = LRUCache(max_entries, max_bytes)
+        self.disk = DiskCache(directory) if directory else None
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def get_or_render(self, key, render):
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+            value = render().encode('utf-8')
+            self.set(key, value)
+        else:
+            self.hits += 1
+        return Markup(value.decode('utf-8'))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self.memory),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+fragment_cache = FragmentCache()
+
+
+def render_cached_fragment(key, template, **context):
+    """Render ``template`` once per ``key`` and return the cached HTML.
+
+    ``context`` values may be callables, which are only called on a miss so
+    that cache hits skip the database entirely.
+    """
+    def render():
+        resolved = {name: value() if callable(value) else value for name, value in context.items()}
+        return render_template(template, **resolved)
+
+    return fragment_cache.get_or_render(key, render)
+
+
+def register_cache(app):
+    fragment_cache.configure(
+        app.config['FRAGMENT_CACHE_MAX_ENTRIES'],
+        app.config['FRAGMENT_CACHE_MAX_BYTES'],
+        app.config.get('FRAGMENT_CACHE_DIR'),
+    )
+
+    @app.cli.command('prune-flight-changes')
+    @click.option('--keep', type=int, default=None, help='Number of newest log rows to keep.')
+    def prune_flight_changes_command(keep):
+        """Trim the flight change log."""
+        removed = prune_flight_changes(keep or app.config['FLIGHT_CHANGE_LOG_RETENTION'])
+        db.session.commit()
+        click.echo(f"Removed {removed} flight change log rows")
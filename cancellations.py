@@ -0,0 +1,169 @@
+"""Operational flight cancellation.
+
+Cancelling a flight refunds every confirmed booking in full, releases the
+seats and marks both the bookings and the flight as cancelled. Everything is
+done with a handful of set-based UPDATE statements in one transaction, so
+cancelling a whole day's schedule costs the same number of round trips as
+cancelling one flight.
+
+Only operators can cancel flights: see ``auth.operator_required`` for the
+session and bearer-token options, and pass ``--operator`` to the CLI command.
+"""
+import logging
+from datetime import datetime, timedelta
+
+import click
+from flask import jsonify, request
+from flask_login import current_user
+from sqlalchemy import and_, func, select, update
+
+from app import db
+from auth import operator_required
+from cache import record_flight_changes
+from models import Booking, Flight, User
+
+logger = logging.getLogger(__name__)
+
+
+def _booked_seats(travel_class, confirmed):
+    return (
+        select(func.count(Booking.id))
+        .where(Booking.flight_id == Flight.id, Booking.travel_class == travel_class, confirmed)
+        .scalar_subquery()
+    )
+
+
+def target_flights(flight_ids=None, departure_date=None):
+    # Subquery selecting the flights to cancel, by id or by departure day.
+    # Correlation is disabled so it stays self-contained inside UPDATE flight.
+    query = select(Flight.id).correlate(None)
+    if flight_ids is not None:
+        query = query.where(Flight.id.in_(flight_ids))
+    if departure_date is not None:
+        day_start = datetime.combine(departure_date, datetime.min.time())
+        query = query.where(and_(
+            Flight.departure_time >= day_start,
+            Flight.departure_time < day_start + timedelta(days=1),
+        ))
+    return query
+
+
+def cancel_flights(flight_ids=None, departure_date=None):
+    """Cancel flights and refund all their confirmed bookings in full.
+
+    Returns a dict with the number of flights and bookings cancelled and
+    the total amount refunded. The caller is responsible for committing.
+    """
+    if flight_ids is None and departure_date is None:
+        raise ValueError("Pass flight_ids, departure_date or both")
+
+    targets = target_flights(flight_ids, departure_date)
+    # Lock the flights before reading their bookings. book_flight takes the
+    # same lock, so no booking can be added to them, or change their seat
+    # counts, between the refunds and the statements that follow
+    db.session.execute(targets.with_for_update()).all()
+    confirmed = and_(Booking.flight_id.in_(targets), Booking.status == 'Confirmed')
+
+    bookings_cancelled, amount_refunded = db.session.execute(
+        select(func.count(Booking.id), func.coalesce(func.sum(Booking.price_paid), 0.0))
+        .where(confirmed)
+    ).one()
+
+    # 1. Refund every affected user the sum of their bookings in one UPDATE
+    refund = (
+        select(func.coalesce(func.sum(Booking.price_paid), 0.0))
+        .where(Booking.user_id == User.id, confirmed)
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(User)
+        .where(User.id.in_(select(Booking.user_id).where(confirmed)))
+        .values(wallet_balance=func.coalesce(User.wallet_balance, 0.0) + refund)
+        .execution_options(synchronize_session=False)
+    )
+
+    # 2. Release the seats and mark the flights cancelled
+    result = db.session.execute(
+        update(Flight)
+        .where(Flight.id.in_(targets))
+        .values(
+            status='Cancelled',
+            available_seats_economy=Flight.available_seats_economy + _booked_seats('economy', confirmed),
+            available_seats_premium=Flight.available_seats_premium + _booked_seats('premium', confirmed),
+            available_seats_business=Flight.available_seats_business + _booked_seats('business', confirmed),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    flights_cancelled = result.rowcount
+    record_flight_changes(Flight.id.in_(targets))
+
+    # 3. Mark the bookings last, since the statements above select on them
+    db.session.execute(
+        update(Booking)
+        .where(confirmed)
+        .values(status='Cancelled')
+        .execution_options(synchronize_session=False)
+    )
+
+    return {
+        'flights_cancelled': flights_cancelled,
+        'bookings_cancelled': bookings_cancelled,
+        'amount_refunded': round(float(amount_refunded), 2),
+    }
+
+
+def register_cancellations(app):
+    @app.route('/api/flights/cancel', methods=['POST'])
+    @operator_required
+    def cancel_flights_api():
+        # Accepts {"flight_ids": [1, 2]} and/or {"date": "YYYY-MM-DD"}
+        payload = request.get_json(silent=True) or {}
+        flight_ids = payload.get('flight_ids')
+        departure_date = payload.get('date')
+
+        if flight_ids is not None and (
+            not isinstance(flight_ids, list)
+            or not all(isinstance(flight_id, int) for flight_id in flight_ids)
+        ):
+            return jsonify({'error': '"flight_ids" must be a list of integers.'}), 400
+        if departure_date is not None:
+            try:
+                departure_date = datetime.strptime(departure_date, '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                return jsonify({'error': '"date" must be in YYYY-MM-DD format.'}), 400
+        if not flight_ids and departure_date is None:
+            return jsonify({'error': 'Pass "flight_ids" or "date".'}), 400
+
+        try:
+            summary = cancel_flights(flight_ids or None, departure_date)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': f'Error cancelling flights: {str(e)}'}), 500
+
+        logger.info("Cancelled flights by %s: %s",
+                    current_user.email if current_user.is_authenticated else 'API token', summary)
+        return jsonify(summary)
+
+    @app.cli.command('cancel-flights')
+    @click.option('--date', 'departure_date', type=click.DateTime(formats=['%Y-%m-%d']),
+                  help='Cancel every flight departing on this day.')
+    @click.option('--flight-id', 'flight_ids', type=int, multiple=True,
+                  help='Flight id to cancel; can be repeated.')
+    @click.option('--operator', required=True, help='Email of the operator cancelling the flights.')
+    def cancel_flights_command(departure_date, flight_ids, operator):
+        """Cancel flights and refund their bookings in full."""
+        if departure_date is None and not flight_ids:
+            raise click.UsageError('Pass --date and/or --flight-id.')
+        if operator.strip().lower() not in app.config['OPERATOR_EMAILS']:
+            raise click.UsageError(f'{operator} is not listed in OPERATOR_EMAILS.')
+        summary = cancel_flights(
+            list(flight_ids) or None,
+            departure_date.date() if departure_date else None,
+        )
+        db.session.commit()
+        logger.info("Cancelled flights by %s: %s", operator, summary)
+        click.echo(
+            f"Cancelled {summary['flights_cancelled']} flights and "
+            f"{summary['bookings_cancelled']} bookings, refunded ₹{summary['amount_refunded']}"
+        )
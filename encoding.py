@@ -0,0 +1,31 @@
+"""Content-Encoding negotiation shared by the JSON API and static assets."""
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Encodings we can produce, preferred first when the client rates them equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encoding, encodings=ENCODINGS):
+    """Pick the best of ``encodings`` allowed by an Accept-Encoding header."""
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = weights.get(encoding, weights.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
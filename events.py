@@ -0,0 +1,271 @@
+"""Live flight status and seat availability feed.
+
+Every open ``/flights/stream`` Server-Sent Events connection subscribes to
+``broker``, which fans deltas out to the streams in its worker. The deltas
+come from the flight change log rather than from the code that made the
+write: one follower thread per worker polls the commit-ordered
+``FlightDataVersion``, and when it moves on, reads the live fields of the
+flights changed since the last poll and publishes them. A write made in any
+worker, or from the CLI, therefore reaches every viewer, and the database
+sees one cheap query per worker per poll however many viewers are open.
+
+Each open stream holds a worker thread, which would starve the default sync
+worker, so the feed is off unless ``LIVE_FEED_ENABLED`` is set; pages then
+skip ``live.js`` and the stream endpoint returns 404, which stops browsers
+from reconnecting.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+
+from flask import Response, abort, current_app, jsonify, request, stream_with_context
+from flask_login import login_required
+from sqlalchemy import func, select, update
+
+from app import db
+from auth import operator_required
+from cache import CHANGE_CHUNK_SIZE, current_flight_data_version, record_flight_changes_by_id
+from models import FLIGHT_STATUSES, Flight, FlightChange
+
+logger = logging.getLogger(__name__)
+
+# Fields pushed to viewers; anything else on Flight is not part of the feed
+LIVE_FIELDS = (
+    'status',
+    'available_seats_economy',
+    'available_seats_premium',
+    'available_seats_business',
+)
+
+
+class Subscription:
+    def __init__(self, flight_ids, max_queue):
+        self.flight_ids = flight_ids
+        self.queue = queue.Queue(maxsize=max_queue)
+        # Set when the client missed deltas, because it fell behind or the
+        # changes were pruned from the log before we read them
+        self.overflowed = False
+
+    def wants(self, flight_id):
+        return self.flight_ids is None or flight_id in self.flight_ids
+
+
+class FlightEventBroker:
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        # Flight data version the follower has published up to
+        self._version = 0
+        self._follower = None
+
+    def subscribe(self, flight_ids=None):
+        subscription = Subscription(frozenset(flight_ids) if flight_ids else None, self.max_queue)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            if self._follower is None:
+                # Callers read the current state after subscribing, so
+                # following from here on loses nothing
+                self._version = current_flight_data_version()
+                self._follower = threading.Thread(
+                    target=self._follow,
+                    args=(current_app._get_current_object(), current_app.config['LIVE_FEED_POLL_SECONDS']),
+                    name='flight-feed',
+                    daemon=True,
+                )
+                self._follower.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def _follow(self, app, poll_seconds):
+        while True:
+            time.sleep(poll_seconds)
+            with self._lock:
+                if not self._subscriptions:
+                    # The next subscriber starts a new follower
+                    self._follower = None
+                    return
+            try:
+                with app.app_context():
+                    self.poll()
+            except Exception:
+                logger.exception("Live feed poll failed")
+
+    def poll(self):
+        """Publish the flights changed since the last poll."""
+        version = current_flight_data_version()
+        if version <= self._version:
+            return
+
+        oldest = db.session.scalar(select(func.min(FlightChange.version)))
+        if oldest is not None and oldest > self._version + 1:
+            # Changes we never saw have been pruned; viewers must reload
+            self._version = version
+            with self._lock:
+                for subscription in self._subscriptions:
+                    subscription.overflowed = True
+            return
+
+        flight_ids = db.session.scalars(
+            select(FlightChange.flight_id)
+            .where(FlightChange.version > self._version, FlightChange.version <= version)
+            .distinct()
+        ).all()
+        rows = []
+        for start in range(0, len(flight_ids), CHANGE_CHUNK_SIZE):
+            rows.extend(db.session.execute(
+                select(Flight.id, *(getattr(Flight, field) for field in LIVE_FIELDS))
+                .where(Flight.id.in_(flight_ids[start:start + CHANGE_CHUNK_SIZE]))
+            ).all())
+        self._version = version
+        self.publish([dict(zip(('id',) + LIVE_FIELDS, row)) for row in rows], version)
+
+    def publish(self, deltas, version):
+        # Each delta is a dict with the flight 'id' and its live fields
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+
+        for subscription in subscriptions:
+            for delta in deltas:
+                if not subscription.wants(delta['id']):
+                    continue
+                try:
+                    subscription.queue.put_nowait((version, delta))
+                except queue.Full:
+                    subscription.overflowed = True
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+
+broker = FlightEventBroker()
+
+
+def _format_event(event, data, event_id=None):
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+def _parse_flight_ids(raw):
+    flight_ids = set()
+    for part in (raw or '').split(','):
+        part = part.strip()
+        if part:
+            if not part.isdigit():
+                abort(400)
+            flight_ids.add(int(part))
+    return flight_ids
+
+
+def register_events(app):
+    @app.route('/flights/stream')
+    @login_required
+    def flight_stream():
+        if not app.config['LIVE_FEED_ENABLED']:
+            abort(404)
+
+        # ids=all follows every flight (used by long lists such as the
+        # schedules page, which already rendered the current state)
+        if request.args.get('ids') == 'all':
+            subscription = broker.subscribe()
+            snapshot = []
+        else:
+            flight_ids = _parse_flight_ids(request.args.get('ids'))
+            if not flight_ids or len(flight_ids) > app.config['LIVE_FEED_MAX_FLIGHTS']:
+                abort(400)
+
+            # Subscribe before reading the current state so nothing published
+            # in between is lost; the client just applies both in order
+            subscription = broker.subscribe(flight_ids)
+            rows = db.session.execute(
+                select(Flight.id, *(getattr(Flight, field) for field in LIVE_FIELDS))
+                .where(Flight.id.in_(flight_ids))
+            ).all()
+            snapshot = [dict(zip(('id',) + LIVE_FIELDS, row)) for row in rows]
+
+        # Release the database connection; the stream itself never queries
+        db.session.remove()
+
+        heartbeat = app.config['LIVE_FEED_HEARTBEAT_SECONDS']
+        max_seconds = app.config['LIVE_FEED_MAX_SECONDS']
+
+        def generate():
+            try:
+                # Ask the browser to reconnect quickly once we close the stream
+                yield "retry: 2000\n\n"
+                yield _format_event('snapshot', snapshot)
+                deadline = time.monotonic() + max_seconds
+                while time.monotonic() < deadline:
+                    if subscription.overflowed:
+                        # The client missed deltas; tell it to reload instead
+                        yield _format_event('resync', {})
+                        return
+                    try:
+                        version, delta = subscription.queue.get(timeout=heartbeat)
+                    except queue.Empty:
+                        yield ": keepalive\n\n"
+                        continue
+                    yield _format_event('flight', delta, version)
+            finally:
+                broker.unsubscribe(subscription)
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+
+    @app.route('/api/flights/status', methods=['POST'])
+    @operator_required
+    def bulk_update_flight_status():
+        # Accepts {"updates": [{"id": 1, "status": "Delayed"}, ...]}. Cancelling
+        # also refunds and releases seats, so it goes through /api/flights/cancel
+        payload = request.get_json(silent=True) or {}
+        updates = payload.get('updates')
+        if not isinstance(updates, list) or not updates:
+            return jsonify({'error': 'Expected a non-empty "updates" list.'}), 400
+
+        statuses = {}
+        for item in updates:
+            if not isinstance(item, dict):
+                return jsonify({'error': 'Each update must be an object.'}), 400
+            flight_id, status = item.get('id'), item.get('status')
+            if status == 'Cancelled':
+                return jsonify({'error': 'Cancel flights through /api/flights/cancel.'}), 400
+            if not isinstance(flight_id, int) or status not in FLIGHT_STATUSES:
+                return jsonify({'error': f'Invalid update: {item}'}), 400
+            statuses[flight_id] = status
+
+        current = dict(db.session.execute(
+            select(Flight.id, Flight.status).where(Flight.id.in_(statuses)).with_for_update()
+        ).all())
+        missing = sorted(set(statuses) - set(current))
+        if missing:
+            db.session.rollback()
+            return jsonify({'error': 'Unknown flights.', 'missing': missing}), 404
+        # Cancelled flights were refunded and may not be sold again
+        cancelled = sorted(flight_id for flight_id, status in current.items() if status == 'Cancelled')
+        if cancelled:
+            db.session.rollback()
+            return jsonify({'error': 'Cancelled flights cannot change status.', 'cancelled': cancelled}), 409
+
+        try:
+            db.session.execute(
+                update(Flight),
+                [{'id': flight_id, 'status': status} for flight_id, status in statuses.items()],
+            )
+            record_flight_changes_by_id(statuses)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': f'Error updating flights: {str(e)}'}), 500
+
+        return jsonify({'updated': len(statuses)})
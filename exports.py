@@ -0,0 +1,199 @@
+"""Passenger manifests and bookings exports.
+
+Both are produced by generators that read rows through a server-side cursor
+(``yield_per``) and emit CSV or JSON Lines a batch at a time, so exports of
+any size run in constant memory. The same generators back the streaming
+HTTP responses and the ``flask export-*`` commands. Both contain passenger
+details, so the HTTP endpoints are for operators only.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+
+import click
+from flask import Response, abort, request, stream_with_context
+from sqlalchemy import select
+
+from app import db
+from auth import operator_required
+from models import Booking, BookingArchive, Flight, FlightArchive
+
+EXPORT_BATCH_SIZE = 1000
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+MANIFEST_FIELDS = [
+    'booking_id', 'passenger_name', 'passenger_age', 'passenger_gender',
+    'travel_class', 'seat_number', 'contact_number', 'status', 'booking_date',
+]
+
+EXPORT_FIELDS = [
+    'booking_id', 'booking_date', 'user_id', 'flight_id', 'flight_number',
+    'origin', 'destination', 'departure_time', 'travel_class', 'seat_number',
+    'price_paid', 'status', 'passenger_name', 'archived',
+]
+
+
+def _manifest_query(booking_model, flight_criterion):
+    return (
+        select(
+            booking_model.id, booking_model.passenger_name, booking_model.passenger_age,
+            booking_model.passenger_gender, booking_model.travel_class, booking_model.seat_number,
+            booking_model.contact_number, booking_model.status, booking_model.booking_date,
+        )
+        .where(flight_criterion)
+        .order_by(booking_model.seat_number, booking_model.id)
+    )
+
+
+def _export_query(booking_model, flight_model, onclause, start, end):
+    return (
+        select(
+            booking_model.id, booking_model.booking_date, booking_model.user_id,
+            booking_model.flight_id, flight_model.flight_number, flight_model.origin,
+            flight_model.destination, flight_model.departure_time, booking_model.travel_class,
+            booking_model.seat_number, booking_model.price_paid, booking_model.status,
+            booking_model.passenger_name,
+        )
+        .join(flight_model, onclause)
+        .where(booking_model.booking_date >= start, booking_model.booking_date < end)
+        .order_by(booking_model.booking_date, booking_model.id)
+    )
+
+
+def _stream_rows(query, extra=()):
+    # Server-side cursor: rows arrive from the database in batches
+    result = db.session.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for batch in result.partitions():
+        yield [tuple(row) + tuple(extra) for row in batch]
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Cannot serialise {type(value).__name__}')
+
+
+def encode_batches(fields, batches, fmt):
+    """Turn batches of row tuples into CSV or JSON Lines text chunks."""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        yield buffer.getvalue()
+        for batch in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(
+                [value.isoformat(sep=' ') if isinstance(value, datetime) else value for value in row]
+                for row in batch
+            )
+            yield buffer.getvalue()
+    else:
+        for batch in batches:
+            yield ''.join(
+                json.dumps(dict(zip(fields, row)), default=_json_default) + '\n' for row in batch
+            )
+
+
+def manifest_batches(flight_id):
+    yield from _stream_rows(_manifest_query(Booking, Booking.flight_id == flight_id))
+
+
+def archived_manifest_batches(archive_id):
+    # Archived flights are addressed by archive_id, since live ids can repeat
+    yield from _stream_rows(_manifest_query(BookingArchive, BookingArchive.flight_archive_id == archive_id))
+
+
+def booking_export_batches(start, end, include_archive=True):
+    yield from _stream_rows(
+        _export_query(Booking, Flight, Flight.id == Booking.flight_id, start, end), extra=(False,))
+    if include_archive:
+        yield from _stream_rows(
+            _export_query(BookingArchive, FlightArchive, FlightArchive.archive_id == BookingArchive.flight_archive_id,
+                          start, end),
+            extra=(True,),
+        )
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        abort(400, description=f'"{name}" must be in YYYY-MM-DD format.')
+
+
+def _streaming_response(chunks, fmt, filename):
+    mimetype, extension = FORMATS[fmt]
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}.{extension}"',
+            'X-Accel-Buffering': 'no',
+        },
+    )
+
+
+def register_exports(app):
+    @app.route('/flights/<int:flight_id>/manifest')
+    @operator_required
+    def flight_manifest(flight_id):
+        fmt = request.args.get('format', 'csv')
+        if fmt not in FORMATS:
+            abort(400)
+        flight = db.session.get(Flight, flight_id) or abort(404)
+        chunks = encode_batches(MANIFEST_FIELDS, manifest_batches(flight_id), fmt)
+        return _streaming_response(chunks, fmt, f'manifest-{flight.flight_number}')
+
+    @app.route('/flights/archive/<int:archive_id>/manifest')
+    @operator_required
+    def archived_flight_manifest(archive_id):
+        fmt = request.args.get('format', 'csv')
+        if fmt not in FORMATS:
+            abort(400)
+        flight = db.session.get(FlightArchive, archive_id) or abort(404)
+        chunks = encode_batches(MANIFEST_FIELDS, archived_manifest_batches(archive_id), fmt)
+        return _streaming_response(chunks, fmt, f'manifest-{flight.flight_number}-{flight.departure_time:%Y%m%d}')
+
+    @app.route('/bookings/export')
+    @operator_required
+    def export_bookings():
+        # Bookings made in [start, end], both dates inclusive
+        fmt = request.args.get('format', 'csv')
+        if fmt not in FORMATS:
+            abort(400)
+        start = _parse_date(request.args.get('start'), 'start')
+        end = _parse_date(request.args.get('end'), 'end')
+        chunks = encode_batches(EXPORT_FIELDS, booking_export_batches(start, end + timedelta(days=1)), fmt)
+        return _streaming_response(chunks, fmt, f'bookings-{start:%Y%m%d}-{end:%Y%m%d}')
+
+    @app.cli.command('export-bookings')
+    @click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), required=True)
+    @click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), required=True,
+                  help='Last booking date to include.')
+    @click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default='csv')
+    @click.option('--output', type=click.File('w', encoding='utf-8'), default='-',
+                  help='Output file; defaults to stdout.')
+    @click.option('--no-archive', is_flag=True, help='Skip archived bookings.')
+    def export_bookings_command(start, end, fmt, output, no_archive):
+        """Dump bookings made between two dates."""
+        batches = booking_export_batches(start, end + timedelta(days=1), include_archive=not no_archive)
+        for chunk in encode_batches(EXPORT_FIELDS, batches, fmt):
+            output.write(chunk)
+
+    @app.cli.command('export-manifest')
+    @click.argument('flight_id', type=int)
+    @click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default='csv')
+    @click.option('--output', type=click.File('w', encoding='utf-8'), default='-',
+                  help='Output file; defaults to stdout.')
+    @click.option('--archived', is_flag=True, help='FLIGHT_ID is the archive_id of an archived flight.')
+    def export_manifest_command(flight_id, fmt, output, archived):
+        """Dump the passenger manifest of one flight."""
+        batches = archived_manifest_batches(flight_id) if archived else manifest_batches(flight_id)
+        for chunk in encode_batches(MANIFEST_FIELDS, batches, fmt):
+            output.write(chunk)
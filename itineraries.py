@@ -0,0 +1,285 @@
+"""Connecting-flight search over timetable arrays, inline or in a process pool.
+
+A broad connecting search (partial city matches on both ends) pairs every
+matching first leg with every matching second leg, which can be far too
+much work for a request worker. ``connection_pairs`` bounds that work with
+a result cap and a deadline, and ``ItineraryPool`` runs it in a small pool
+of worker processes that read a memory-mapped, read-only copy of the
+timetable written once per snapshot version.
+
+This module only depends on NumPy so that pool processes can import it
+without loading the application. Spawned processes also re-import the
+script the server was started from; main.py skips building the app there.
+
+The timetable copy is keyed by the snapshot's schedule version, which only
+moves when cities or times change, so bookings and fare or status updates
+do not cause it to be rewritten.
+"""
+import atexit
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+TIMETABLE_COLUMNS = ('id', 'origin', 'destination', 'departure_time', 'arrival_time')
+
+# Check the deadline once every this many first legs
+_DEADLINE_CHECK_EVERY = 64
+
+# Extra time to wait for a pool result after its deadline has passed
+_RESULT_GRACE_SECONDS = 0.5
+
+
+def _group_by_origin(rows, origins):
+    # Stable sort keeps row order inside each origin city
+    rows = rows[np.argsort(origins[rows], kind='stable')]
+    return rows, origins[rows]
+
+
+def _legs_from(grouped, city):
+    rows, cities = grouped
+    return rows[np.searchsorted(cities, city, 'left'):np.searchsorted(cities, city, 'right')]
+
+
+def connection_pairs(timetable, first_legs, exact_second, partial_second, min_layover_seconds,
+                     max_results=None, deadline=None):
+    """Pair first legs with second legs leaving their arrival city in time.
+
+    ``first_legs``, ``exact_second`` and ``partial_second`` are row numbers
+    into ``timetable``. Second legs matching the destination exactly are
+    preferred; partial matches are only used from connection cities without
+    an exact one. Returns ``(pairs, complete)`` where ``pairs`` is a list of
+    ``(first_id, second_id)`` in first-leg order. When more than
+    ``max_results`` pairs exist, the ones with the shortest total journey are
+    kept; when ``deadline`` (a ``time.time()`` value) passes, the pairs found
+    so far are returned. ``complete`` is False in either case.
+    """
+    ids = timetable['id']
+    origins = timetable['origin']
+    departures = timetable['departure_time']
+    arrivals = timetable['arrival_time']
+    min_layover = np.timedelta64(int(min_layover_seconds), 's')
+
+    exact = _group_by_origin(np.asarray(exact_second), origins)
+    partial = _group_by_origin(np.asarray(partial_second), origins)
+
+    found_first, found_second = [], []
+    found = 0
+    complete = True
+    for position, first in enumerate(np.asarray(first_legs).tolist()):
+        if deadline is not None and position % _DEADLINE_CHECK_EVERY == 0 and time.time() >= deadline:
+            complete = False
+            break
+
+        city = timetable['destination'][first]
+        second_legs = _legs_from(exact, city)
+        if not second_legs.size:
+            second_legs = _legs_from(partial, city)
+        second_legs = second_legs[departures[second_legs] > arrivals[first] + min_layover]
+        if not second_legs.size:
+            continue
+
+        found_first.append(np.full(second_legs.size, first))
+        found_second.append(second_legs)
+        found += second_legs.size
+
+        # Keep memory bounded on huge result sets by pruning as we go
+        if max_results is not None and found > 4 * max_results:
+            kept = _shortest(np.concatenate(found_first), np.concatenate(found_second),
+                             departures, arrivals, max_results)
+            found_first, found_second = [kept[0]], [kept[1]]
+            found = max_results
+            complete = False
+
+    if not found_first:
+        return [], complete
+
+    first_rows = np.concatenate(found_first)
+    second_rows = np.concatenate(found_second)
+    if max_results is not None and first_rows.size > max_results:
+        first_rows, second_rows = _shortest(first_rows, second_rows, departures, arrivals, max_results)
+        complete = False
+    return list(zip(ids[first_rows].tolist(), ids[second_rows].tolist())), complete
+
+
+def _shortest(first_rows, second_rows, departures, arrivals, limit):
+    # The ``limit`` pairs with the shortest total journey, in their original order
+    durations = arrivals[second_rows] - departures[first_rows]
+    keep = np.sort(np.argpartition(durations, limit - 1)[:limit]) if first_rows.size > limit \
+        else np.arange(first_rows.size)
+    return first_rows[keep], second_rows[keep]
+
+
+def dump_timetable(arrays, directory, name):
+    """Write the timetable columns as .npy files under directory/name.
+
+    The files are written to a temporary directory first and renamed into
+    place, so readers never see a partial timetable.
+    """
+    path = os.path.join(directory, name)
+    if os.path.isdir(path):
+        return path
+    staging = tempfile.mkdtemp(prefix=f'.{name}-', dir=directory)
+    for column in TIMETABLE_COLUMNS:
+        np.save(os.path.join(staging, f'{column}.npy'), np.ascontiguousarray(arrays[column]))
+    try:
+        os.rename(staging, path)
+    except OSError:
+        # Another thread published the same version first
+        shutil.rmtree(staging, ignore_errors=True)
+    return path
+
+
+_loaded_timetables = {}
+
+
+def load_timetable(path):
+    timetable = _loaded_timetables.get(path)
+    if timetable is None:
+        timetable = {
+            column: np.load(os.path.join(path, f'{column}.npy'), mmap_mode='r')
+            for column in TIMETABLE_COLUMNS
+        }
+        if len(_loaded_timetables) >= 4:
+            _loaded_timetables.pop(next(iter(_loaded_timetables)))
+        _loaded_timetables[path] = timetable
+    return timetable
+
+
+def find_connections(path, *args, **kwargs):
+    """Pool entry point: ``connection_pairs`` over a timetable on disk."""
+    return connection_pairs(load_timetable(path), *args, **kwargs)
+
+
+def _warm_up():
+    return os.getpid()
+
+
+class ItineraryPool:
+    """A bounded process pool for expensive connecting searches.
+
+    Each web worker process owns its own pool, started on first use. Pool
+    processes are spawned rather than forked, so they never inherit the web
+    worker's threads, locks or database connections.
+    """
+
+    def __init__(self):
+        self.workers = 0
+        self.max_pending = 0
+        self.directory = None
+        self._owns_directory = False
+        self._executor = None
+        self._owner_pid = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._timetables = []
+        self.offloaded = 0
+        self.inline = 0
+        self.partial = 0
+        self.timed_out = 0
+
+    def configure(self, workers, max_pending=None, directory=None):
+        self.shutdown()
+        self.workers = workers
+        self.max_pending = max_pending or 2 * workers
+        self._slots = threading.BoundedSemaphore(self.max_pending) if workers else None
+        self._owns_directory = directory is None
+        self.directory = directory
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is not None and self._owner_pid != os.getpid():
+                # Inherited across a fork (e.g. a preloading server); start afresh
+                self._executor = None
+                self._timetables = []
+            if self._executor is None:
+                if not self._owns_directory:
+                    os.makedirs(self.directory, exist_ok=True)
+                elif self.directory is None or self._owner_pid != os.getpid():
+                    self.directory = tempfile.mkdtemp(prefix='airoven-timetables-')
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+                self._owner_pid = os.getpid()
+                self._executor.submit(_warm_up)
+            return self._executor
+
+    def timetable(self, arrays, version):
+        """Path of the on-disk timetable for this schedule version."""
+        name = f'{os.getpid()}-v{version}'
+        with self._lock:
+            path = dump_timetable(arrays, self.directory, name)
+            if path not in self._timetables:
+                self._timetables.append(path)
+                # Keep the previous version for searches still reading it
+                while len(self._timetables) > 2:
+                    shutil.rmtree(self._timetables.pop(0), ignore_errors=True)
+        return path
+
+    def search(self, arrays, version, *args, deadline, **kwargs):
+        """Run ``connection_pairs`` in the pool, or inline when it is saturated.
+
+        Returns ``(pairs, complete)`` as ``connection_pairs`` does; a search
+        that misses its deadline in the pool returns no pairs.
+        """
+        if not self._slots.acquire(blocking=False):
+            # Every pool slot is busy; the deadline still bounds the work
+            self.inline += 1
+            result = connection_pairs(arrays, *args, deadline=deadline, **kwargs)
+            self.partial += not result[1]
+            return result
+
+        try:
+            executor = self._get_executor()
+            future = executor.submit(find_connections, self.timetable(arrays, version),
+                                     *args, deadline=deadline, **kwargs)
+            self.offloaded += 1
+            try:
+                result = future.result(timeout=max(0.0, deadline - time.time()) + _RESULT_GRACE_SECONDS)
+            except FutureTimeoutError:
+                future.cancel()
+                self.timed_out += 1
+                self.partial += 1
+                return [], False
+            self.partial += not result[1]
+            return result
+        except BrokenProcessPool:
+            with self._lock:
+                self._executor = None
+            self.inline += 1
+            return connection_pairs(arrays, *args, deadline=deadline, **kwargs)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'offloaded': self.offloaded,
+            'inline_fallbacks': self.inline,
+            'partial': self.partial,
+            'timed_out': self.timed_out,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            if executor is not None and self._owner_pid == os.getpid():
+                executor.shutdown(wait=False, cancel_futures=True)
+                if self._owns_directory and self.directory:
+                    shutil.rmtree(self.directory, ignore_errors=True)
+                    self.directory = None
+            self._timetables = []
+
+
+itinerary_pool = ItineraryPool()
+atexit.register(itinerary_pool.shutdown)
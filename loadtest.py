@@ -0,0 +1,639 @@
+"""Local load test for the booking flow.
+
+Starts the app under gunicorn on localhost against a fresh SQLite database
+and replays scripted user journeys through the real HTML forms (CSRF tokens
+included): signup, login, quiz, wallet top-up, search, flight details,
+booking, my bookings and cancellation. Users arrive as a Poisson process at
+``--rate`` per second and each one runs a journey drawn from ``--mix``.
+
+When the run ends the report lists throughput, latency percentiles and
+error rates per route, journey outcomes, and the consistency checks made
+against the database: seats sold must match confirmed bookings on every
+flight, and every user's wallet must match the top-ups, bonuses, fares and
+refunds the harness observed.
+
+Only the standard library is used; run it with the project's interpreter:
+
+    python loadtest.py --rate 5 --duration 60 --workers 4
+    python loadtest.py --mix browse=1,book=3,book_cancel=1 --hot-routes 2
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from html import unescape
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+BASE_STEPS = ('signup', 'login', 'quiz')
+JOURNEYS = {
+    'browse': BASE_STEPS + ('search', 'details'),
+    'book': BASE_STEPS + ('topup', 'search', 'details', 'book', 'my_bookings'),
+    'book_cancel': BASE_STEPS + ('topup', 'search', 'details', 'book', 'my_bookings', 'cancel'),
+}
+DEFAULT_MIX = 'browse=2,book=5,book_cancel=3'
+
+QUIZ_ANSWERS = {'question_1': 'B', 'question_2': 'C', 'question_3': 'D', 'question_4': 'B', 'question_5': 'C'}
+CLASS_WEIGHTS = {'economy': 8, 'premium': 3, 'business': 1}
+PASSWORD = 'Loadtest1'
+
+_CSRF_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"|value="([^"]+)"[^>]*name="csrf_token"')
+_FLASH_RE = re.compile(r'<div class="alert alert-(\w+)[^"]*"[^>]*>(.*?)<', re.S)
+_FLIGHT_LINK_RE = re.compile(r'/(?:book_flight|flight_details)/(\d+)')
+_CANCEL_LINK_RE = re.compile(r'/cancel_booking/(\d+)')
+_BONUS_RE = re.compile(r'earned ₹([\d.]+)')
+_TOPUP_RE = re.compile(r'₹([\d.]+) added to your wallet')
+_REFUND_RE = re.compile(r'₹([\d.]+) has been refunded')
+_ID_SEGMENT_RE = re.compile(r'/\d+(?=/|$)')
+
+
+class JourneyError(Exception):
+    """A request failed or returned something the journey cannot continue from."""
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.statuses = defaultdict(Counter)
+        self.outcomes = defaultdict(Counter)
+
+    def record(self, route, status, elapsed, error):
+        with self._lock:
+            self.latencies[route].append(elapsed)
+            self.statuses[route][status] += 1
+            if error:
+                self.errors[route] += 1
+
+    def outcome(self, journey, outcome):
+        with self._lock:
+            self.outcomes[journey][outcome] += 1
+
+
+def route_label(method, path):
+    # /flight_details/12?x=1 -> GET /flight_details/<id>
+    return f"{method} {_ID_SEGMENT_RE.sub('/<id>', urlsplit(path).path)}"
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class Client:
+    """A browser-like HTTP session: keeps cookies and follows redirects."""
+
+    def __init__(self, host, port, stats, timeout):
+        self.host = host
+        self.port = port
+        self.stats = stats
+        self.timeout = timeout
+        self.cookies = {}
+        self.conn = None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _send(self, method, path, form):
+        headers = {'Host': f'{self.host}:{self.port}'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        body = None
+        if form is not None:
+            body = urlencode(form).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # Keep-alive connection closed by the server between requests
+                self.close()
+                if attempt:
+                    raise
+        if response.will_close:
+            self.close()
+
+        for header, value in response.getheaders():
+            if header.lower() == 'set-cookie':
+                name, _, rest = value.partition('=')
+                cookie_value = rest.split(';', 1)[0]
+                if cookie_value and 'expires=thu, 01 jan 1970' not in value.lower():
+                    self.cookies[name.strip()] = cookie_value
+                else:
+                    self.cookies.pop(name.strip(), None)
+        return response.status, response.getheader('Location'), data.decode('utf-8', 'replace')
+
+    def request(self, method, path, form=None):
+        """Send a request and follow redirects; returns (status, final path, html)."""
+        for _ in range(5):
+            label = route_label(method, path)
+            start = time.perf_counter()
+            try:
+                status, location, html = self._send(method, path, form)
+            except (OSError, http.client.HTTPException) as e:
+                self.stats.record(label, 0, time.perf_counter() - start, True)
+                self.close()
+                raise JourneyError(f'{label}: {type(e).__name__}: {e}') from e
+            self.stats.record(label, status, time.perf_counter() - start, status >= 400)
+
+            if status >= 400:
+                raise JourneyError(f'{label}: HTTP {status}')
+            if status in (301, 302, 303, 307, 308) and location:
+                method, form = 'GET', None
+                path = urlsplit(location)._replace(scheme='', netloc='').geturl() or '/'
+                continue
+            return status, path, html
+        raise JourneyError(f'{label}: too many redirects')
+
+
+def csrf_token(html):
+    match = _CSRF_RE.search(html)
+    if not match:
+        raise JourneyError('no CSRF token on page')
+    return unescape(match.group(1) or match.group(2))
+
+
+def flashes(html):
+    return [(category, unescape(' '.join(text.split()))) for category, text in _FLASH_RE.findall(html)]
+
+
+def flash_matching(html, pattern):
+    for _, text in flashes(html):
+        match = pattern.search(text)
+        if match:
+            return match
+    return None
+
+
+class VirtualUser:
+    """One simulated customer running a journey and keeping a wallet ledger."""
+
+    def __init__(self, client, rng, routes, think_time, topup):
+        self.client = client
+        self.rng = rng
+        self.routes = routes
+        self.think_time = think_time
+        self.topup_amount = topup
+        self.email = f'lt-{uuid.uuid4().hex[:12]}@loadtest.example.com'
+        self.registered = False
+        # Ledger of wallet movements confirmed by the app's own messages
+        self.credits = 0.0
+        self.refunds = 0.0
+        # Set when a request's effect is unknown (timeout, server error)
+        self.uncertain = False
+        self.flight_id = None
+        self.booking_ids = []
+        self.bookings_html = ''
+
+    def run(self, steps):
+        for step in steps:
+            if self.think_time:
+                time.sleep(self.rng.expovariate(1 / self.think_time))
+            result = getattr(self, step)()
+            if result is not None:
+                return result
+        return 'completed'
+
+    def _get_form(self, path):
+        return csrf_token(self.client.request('GET', path)[2])
+
+    def signup(self):
+        token = self._get_form('/signup')
+        _, path, _ = self.client.request('POST', '/signup', {
+            'csrf_token': token,
+            'first_name': 'Load',
+            'last_name': 'Test',
+            'email': self.email,
+            'age': self.rng.randint(18, 80),
+            'gender': self.rng.choice(['male', 'female', 'other']),
+            'password': PASSWORD,
+            'confirm_password': PASSWORD,
+        })
+        if not path.startswith('/login'):
+            raise JourneyError('signup was not accepted')
+        self.registered = True
+
+    def login(self):
+        token = self._get_form('/login')
+        _, path, _ = self.client.request('POST', '/login', {
+            'csrf_token': token, 'email': self.email, 'password': PASSWORD,
+        })
+        if not path.startswith('/quiz'):
+            raise JourneyError('login did not lead to the quiz')
+
+    def quiz(self):
+        token = self._get_form('/quiz')
+        _, _, html = self.client.request('POST', '/quiz', dict(QUIZ_ANSWERS, csrf_token=token))
+        match = flash_matching(html, _BONUS_RE)
+        if match is None:
+            self.uncertain = True
+            raise JourneyError('quiz bonus was not confirmed')
+        self.credits += float(match.group(1))
+
+    def topup(self):
+        token = self._get_form('/wallet')
+        _, _, html = self.client.request('POST', '/wallet', {
+            'csrf_token': token, 'amount': self.topup_amount,
+        })
+        match = flash_matching(html, _TOPUP_RE)
+        if match is None:
+            self.uncertain = True
+            raise JourneyError('wallet top-up was not confirmed')
+        self.credits += float(match.group(1))
+
+    def search(self):
+        origin, destination = self.rng.choice(self.routes)
+        token = self._get_form('/search_flights')
+        _, _, html = self.client.request('POST', '/search_flights', {
+            'csrf_token': token, 'origin': origin, 'destination': destination,
+        })
+        flight_ids = sorted(set(int(flight_id) for flight_id in _FLIGHT_LINK_RE.findall(html)))
+        if not flight_ids:
+            return 'no_results'
+        self.flight_id = self.rng.choice(flight_ids)
+
+    def details(self):
+        self.client.request('GET', f'/flight_details/{self.flight_id}')
+
+    def book(self):
+        path = f'/book_flight/{self.flight_id}'
+        _, final_path, html = self.client.request('GET', path)
+        if final_path != path:
+            return 'flight_unavailable'
+
+        travel_class = self.rng.choices(list(CLASS_WEIGHTS), weights=list(CLASS_WEIGHTS.values()))[0]
+        try:
+            _, _, html = self.client.request('POST', path, {
+                'csrf_token': csrf_token(html),
+                'flight_id': self.flight_id,
+                'travel_class': travel_class,
+                'passenger_name': 'Load Test',
+                'passenger_age': self.rng.randint(18, 80),
+                'passenger_gender': 'other',
+                'contact_number': '9876543210',
+            })
+        except JourneyError:
+            # The booking may or may not have been written
+            self.uncertain = True
+            raise
+
+        messages = ' '.join(text for _, text in flashes(html))
+        if 'booked successfully' in messages:
+            return None
+        if 'No seats available' in messages:
+            return 'sold_out'
+        if 'Insufficient balance' in messages:
+            return 'insufficient_balance'
+        if 'cancelled' in messages:
+            return 'flight_unavailable'
+        self.uncertain = True
+        raise JourneyError('booking outcome not recognised')
+
+    def my_bookings(self):
+        _, _, html = self.client.request('GET', '/my_bookings')
+        self.booking_ids = [int(booking_id) for booking_id in _CANCEL_LINK_RE.findall(html)]
+        self.bookings_html = html
+
+    def cancel(self):
+        if not self.booking_ids:
+            raise JourneyError('booking missing from my bookings')
+        booking_id = self.rng.choice(self.booking_ids)
+        try:
+            _, _, html = self.client.request('POST', f'/cancel_booking/{booking_id}', {
+                'csrf_token': csrf_token(self.bookings_html),
+            })
+        except JourneyError:
+            self.uncertain = True
+            raise
+        match = flash_matching(html, _REFUND_RE)
+        if match is None:
+            self.uncertain = True
+            raise JourneyError('refund was not confirmed')
+        self.refunds += float(match.group(1))
+
+
+class Server:
+    """gunicorn serving main:app on localhost against its own SQLite file."""
+
+    def __init__(self, workdir, workers, threads, port):
+        self.workdir = workdir
+        self.workers = workers
+        self.threads = threads
+        self.port = port or _free_port()
+        self.db_path = os.path.join(workdir, 'loadtest.db')
+        self.log_path = os.path.join(workdir, 'server.log')
+        self.env = dict(
+            os.environ,
+            DATABASE_URL=f'sqlite:///{self.db_path}',
+            PRICING_INTERVAL_SECONDS='0',
+        )
+        self.proc = None
+
+    def start(self):
+        self.log = open(self.log_path, 'ab')
+        # Create the schema and seed flights once, before workers race to do it
+        subprocess.run([sys.executable, '-c', 'import main'], cwd=ROOT, env=self.env,
+                       stdout=self.log, stderr=self.log, check=True)
+
+        command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{self.port}',
+                   '--workers', str(self.workers), '--log-level', 'warning']
+        if self.threads > 1:
+            command += ['--threads', str(self.threads)]
+        self.proc = subprocess.Popen(command + ['main:app'], cwd=ROOT, env=self.env,
+                                     stdout=self.log, stderr=self.log)
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with code {self.proc.returncode}; see {self.log_path}')
+            try:
+                with socket.create_connection(('127.0.0.1', self.port), timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError(f'gunicorn did not start listening; see {self.log_path}')
+
+    def stop(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        self.log.close()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seat_inventory(db_path):
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(
+            'SELECT id, available_seats_economy, available_seats_premium, available_seats_business FROM flight'
+        ).fetchall()
+    return {flight_id: {'economy': e, 'premium': p, 'business': b} for flight_id, e, p, b in rows}
+
+
+def searchable_routes(db_path, hot_routes):
+    with sqlite3.connect(db_path) as conn:
+        routes = conn.execute(
+            "SELECT origin, destination, COUNT(*) FROM flight WHERE status != 'Cancelled' "
+            'GROUP BY origin, destination ORDER BY COUNT(*) DESC, origin, destination'
+        ).fetchall()
+    routes = [(origin, destination) for origin, destination, _ in routes]
+    if hot_routes:
+        # Concentrate demand on a few routes to provoke contention on their seats
+        routes = routes[:hot_routes]
+    return routes
+
+
+def check_seats(db_path, initial):
+    """Seats sold on each flight must equal its confirmed bookings."""
+    problems = []
+    with sqlite3.connect(db_path) as conn:
+        confirmed = Counter({
+            (flight_id, travel_class): count
+            for flight_id, travel_class, count in conn.execute(
+                "SELECT flight_id, travel_class, COUNT(*) FROM booking WHERE status = 'Confirmed' "
+                'GROUP BY flight_id, travel_class'
+            )
+        })
+        current = seat_inventory(db_path)
+
+    for flight_id, seats in initial.items():
+        for travel_class, available_before in seats.items():
+            available = current.get(flight_id, {}).get(travel_class)
+            if available is None:
+                continue
+            sold = available_before - available
+            booked = confirmed[(flight_id, travel_class)]
+            if available < 0:
+                problems.append(f'flight {flight_id} {travel_class}: {available} seats available (oversold)')
+            if sold != booked:
+                kind = 'oversold' if booked > sold else 'seats leaked'
+                problems.append(
+                    f'flight {flight_id} {travel_class}: {sold} seats taken but {booked} confirmed bookings ({kind})')
+    return problems
+
+
+def check_wallets(db_path, users):
+    """Every wallet must equal its credits minus fares paid plus refunds received."""
+    problems = []
+    checked = 0
+    with sqlite3.connect(db_path) as conn:
+        balances = dict(conn.execute(
+            "SELECT email, wallet_balance FROM user WHERE email LIKE 'lt-%@loadtest.example.com'"))
+        fares = dict(conn.execute(
+            'SELECT user.email, SUM(booking.price_paid) FROM booking JOIN user ON user.id = booking.user_id '
+            'GROUP BY user.email'))
+
+    for user in users:
+        if not user.registered or user.uncertain or user.email not in balances:
+            continue
+        checked += 1
+        # A cancelled booking is deleted after refunding half its fare, so the
+        # other half is exactly the refund received
+        expected = user.credits - (fares.get(user.email) or 0.0) - user.refunds
+        actual = balances[user.email]
+        if abs(expected - actual) > 0.01:
+            problems.append(f'{user.email}: wallet {actual:.2f}, expected {expected:.2f}')
+    return checked, problems
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in JOURNEYS:
+            raise argparse.ArgumentTypeError(f'unknown journey {name!r}; choose from {", ".join(JOURNEYS)}')
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'bad weight for {name!r}')
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError('the mix needs at least one positive weight')
+    return mix
+
+
+def run_load(args, server, routes, stats):
+    rng = random.Random(args.seed)
+    names = list(args.mix)
+    weights = [args.mix[name] for name in names]
+    slots = threading.BoundedSemaphore(args.max_users)
+    users, threads = [], []
+    dropped = 0
+
+    def journey(user, name):
+        try:
+            stats.outcome(name, user.run(JOURNEYS[name]))
+        except JourneyError as e:
+            stats.outcome(name, 'error')
+            if args.verbose:
+                print(f'[{name}] {user.email}: {e}', file=sys.stderr)
+        finally:
+            user.client.close()
+            slots.release()
+
+    start = time.perf_counter()
+    next_arrival = start
+    while True:
+        next_arrival += rng.expovariate(args.rate)
+        if next_arrival - start >= args.duration:
+            break
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        name = rng.choices(names, weights=weights)[0]
+        if not slots.acquire(blocking=False):
+            # Open model: arrivals are not delayed when every user slot is busy
+            dropped += 1
+            continue
+        client = Client('127.0.0.1', server.port, stats, args.timeout)
+        user = VirtualUser(client, random.Random(rng.random()), routes, args.think_time, args.topup)
+        users.append(user)
+        thread = threading.Thread(target=journey, args=(user, name), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+    return users, dropped, time.perf_counter() - start
+
+
+def build_report(stats, elapsed, dropped, users, seat_problems, wallets_checked, wallet_problems):
+    routes = {}
+    for route, samples in sorted(stats.latencies.items()):
+        ordered = sorted(samples)
+        routes[route] = {
+            'requests': len(ordered),
+            'throughput': round(len(ordered) / elapsed, 2),
+            'error_rate': round(stats.errors[route] / len(ordered), 4),
+            'p50_ms': round(percentile(ordered, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(ordered, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(ordered, 0.99) * 1000, 1),
+            'max_ms': round(ordered[-1] * 1000, 1),
+            'statuses': {str(status): count for status, count in sorted(stats.statuses[route].items())},
+        }
+    total = sum(route['requests'] for route in routes.values())
+    return {
+        'elapsed_seconds': round(elapsed, 2),
+        'users': len(users),
+        'dropped_arrivals': dropped,
+        'requests': total,
+        'throughput': round(total / elapsed, 2) if elapsed else 0.0,
+        'error_rate': round(sum(stats.errors.values()) / total, 4) if total else 0.0,
+        'routes': routes,
+        'journeys': {name: dict(outcomes) for name, outcomes in sorted(stats.outcomes.items())},
+        'consistency': {
+            'seat_problems': seat_problems,
+            'wallets_checked': wallets_checked,
+            'wallets_unverifiable': sum(1 for user in users if user.registered and user.uncertain),
+            'wallet_problems': wallet_problems,
+        },
+    }
+
+
+def print_report(report):
+    print(f"\n{report['users']} users, {report['requests']} requests in {report['elapsed_seconds']}s "
+          f"({report['throughput']} req/s, {report['error_rate']:.2%} errors, "
+          f"{report['dropped_arrivals']} arrivals dropped)\n")
+
+    print(f"{'route':<36}{'reqs':>7}{'req/s':>8}{'err%':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for route, row in report['routes'].items():
+        print(f"{route:<36}{row['requests']:>7}{row['throughput']:>8}{row['error_rate'] * 100:>8.2f}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['max_ms']:>9}")
+
+    print('\njourneys:')
+    for name, outcomes in report['journeys'].items():
+        print(f"  {name:<14}" + ', '.join(f'{outcome}={count}' for outcome, count in sorted(outcomes.items())))
+
+    consistency = report['consistency']
+    print(f"\nconsistency: {len(consistency['seat_problems'])} seat problems, "
+          f"{len(consistency['wallet_problems'])} wallet problems "
+          f"({consistency['wallets_checked']} wallets checked, "
+          f"{consistency['wallets_unverifiable']} unverifiable after failed requests)")
+    for problem in consistency['seat_problems'] + consistency['wallet_problems']:
+        print(f'  {problem}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rate', type=float, default=2.0, help='New users per second (Poisson arrivals).')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds during which users arrive.')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'Journey weights, e.g. {DEFAULT_MIX}. Journeys: {", ".join(JOURNEYS)}.')
+    parser.add_argument('--max-users', type=int, default=200, help='Concurrent users before arrivals are dropped.')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Mean pause between steps in seconds.')
+    parser.add_argument('--topup', type=float, default=300000.0, help='Amount added to the wallet before booking.')
+    parser.add_argument('--hot-routes', type=int, default=0,
+                        help='Only search the N busiest routes (0 searches every route).')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes.')
+    parser.add_argument('--threads', type=int, default=1, help='Threads per gunicorn worker.')
+    parser.add_argument('--port', type=int, default=0, help='Port to bind (default: any free port).')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds.')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for a repeatable run.')
+    parser.add_argument('--json', dest='json_path', help='Also write the report to this file as JSON.')
+    parser.add_argument('--keep', action='store_true', help='Keep the database and server log afterwards.')
+    parser.add_argument('--verbose', action='store_true', help='Print every failed journey.')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='airoven-loadtest-')
+    server = Server(workdir, args.workers, args.threads, args.port)
+    stats = Stats()
+    try:
+        server.start()
+        initial_seats = seat_inventory(server.db_path)
+        routes = searchable_routes(server.db_path, args.hot_routes)
+        print(f'gunicorn on 127.0.0.1:{server.port} with {args.workers} workers; '
+              f'{len(initial_seats)} flights, {len(routes)} routes; running for {args.duration:g}s')
+        users, dropped, elapsed = run_load(args, server, routes, stats)
+    finally:
+        server.stop()
+
+    seat_problems = check_seats(server.db_path, initial_seats)
+    wallets_checked, wallet_problems = check_wallets(server.db_path, users)
+    report = build_report(stats, elapsed, dropped, users, seat_problems, wallets_checked, wallet_problems)
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.keep:
+        print(f'\ndatabase and server log kept in {workdir}')
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if seat_problems or wallet_problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,7 @@
-from app import app
+# Processes started with the spawn method (the itinerary search pool)
+# re-import this file as __mp_main__ and must not build the app again
+if __name__ != "__mp_main__":
+    from app import app
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -36,6 +36,10 @@ class User(UserMixin, db.Model):
     def _repr_(self):
         return f'<User {self.email}>'
 
+# Statuses a flight can be in. Seeded flights use 'Advance' while the add
+# flight form submits 'Advanced', so both are accepted.
+FLIGHT_STATUSES = ('On Time', 'Delayed', 'Advance', 'Advanced', 'Cancelled')
+
 class Flight(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     flight_number = db.Column(db.String(10), unique=True, nullable=False)
@@ -88,22 +92,6 @@ class Flight(db.Model):
         elif travel_class == 'business':
             self.available_seats_business += 1
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'flight_number': self.flight_number,
-            'origin': self.origin,
-            'destination': self.destination,
-            'departure_time': self.departure_time.strftime('%Y-%m-%d %H:%M'),
-            'arrival_time': self.arrival_time.strftime('%Y-%m-%d %H:%M'),
-            'status': self.status,
-            'economy_price': self.economy_price,
-            'premium_price': self.premium_price,
-            'business_price': self.business_price,
-            'aircraft_type': self.aircraft_type,
-            'distance_km': self.distance_km
-        }
-
     def _repr_(self):
         return f'<Flight {self.flight_number}>'
 
@@ -122,4 +110,200 @@ class Booking(db.Model):
     status = db.Column(db.String(20), default="Confirmed")
 
     def _repr_(self):
-        return f'<Booking {self.id}>'
\ No newline at end of file
+        return f'<Booking {self.id}>'
+
+class FareBasis(db.Model):
+    # Base fares and seat capacity per flight, used by the pricing engine to
+    # recompute fares without compounding previous adjustments
+    flight_id = db.Column(db.Integer, db.ForeignKey('flight.id', ondelete='CASCADE'), primary_key=True)
+    base_economy_price = db.Column(db.Float, nullable=False)
+    base_premium_price = db.Column(db.Float, nullable=False)
+    base_business_price = db.Column(db.Float, nullable=False)
+    capacity_economy = db.Column(db.Integer, nullable=False)
+    capacity_premium = db.Column(db.Integer, nullable=False)
+    capacity_business = db.Column(db.Integer, nullable=False)
+
+    def _repr_(self):
+        return f'<FareBasis {self.flight_id}>'
+
+class ScheduledJob(db.Model):
+    # Last run of a job that every worker schedules; claimed once per interval
+    name = db.Column(db.String(32), primary_key=True)
+    last_run_at = db.Column(db.DateTime)
+
+    def _repr_(self):
+        return f'<ScheduledJob {self.name}>'
+
+class FlightChange(db.Model):
+    # Append-only log of flight writes. ``version`` is the FlightDataVersion
+    # of the transaction that wrote the row, stamped just before it commits.
+    id = db.Column(db.Integer, primary_key=True)
+    flight_id = db.Column(db.Integer, nullable=False, index=True)
+    origin = db.Column(db.String(64))
+    destination = db.Column(db.String(64))
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    version = db.Column(db.Integer, index=True)
+
+    def _repr_(self):
+        return f'<FlightChange {self.id} flight={self.flight_id} v{self.version}>'
+
+class FlightDataVersion(db.Model):
+    # Single-row counter bumped by every transaction that changes flights.
+    # Bumping locks the row until commit, so versions follow commit order,
+    # which autoincrement ids do not guarantee on PostgreSQL.
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def _repr_(self):
+        return f'<FlightDataVersion {self.version}>'
+
+class FlightArchive(db.Model):
+    # Departed flights moved out of the live flight table by the archival job.
+    # ``id`` is the flight's live id; SQLite reuses ids of deleted rows, so it
+    # is not unique here and the archive has its own key.
+    archive_id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, nullable=False, index=True)
+    flight_number = db.Column(db.String(10), nullable=False)
+    origin = db.Column(db.String(64), nullable=False)
+    destination = db.Column(db.String(64), nullable=False)
+    departure_time = db.Column(db.DateTime, nullable=False, index=True)
+    arrival_time = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20))
+    economy_price = db.Column(db.Float, nullable=False)
+    premium_price = db.Column(db.Float, nullable=False)
+    business_price = db.Column(db.Float, nullable=False)
+    available_seats_economy = db.Column(db.Integer)
+    available_seats_premium = db.Column(db.Integer)
+    available_seats_business = db.Column(db.Integer)
+    aircraft_type = db.Column(db.String(50), nullable=False)
+    distance_km = db.Column(db.Integer)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    bookings = db.relationship('BookingArchive', backref='flight', lazy=True)
+
+    def _repr_(self):
+        return f'<FlightArchive {self.archive_id} {self.flight_number}>'
+
+class BookingArchive(db.Model):
+    # Bookings of archived flights, kept for trip history and exports. ``id``
+    # and ``flight_id`` are the live ids, like FlightArchive.id.
+    archive_id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    flight_id = db.Column(db.Integer, nullable=False)
+    flight_archive_id = db.Column(db.Integer, db.ForeignKey('flight_archive.archive_id'), nullable=False, index=True)
+    booking_date = db.Column(db.DateTime)
+    travel_class = db.Column(db.String(20), nullable=False)
+    seat_number = db.Column(db.String(5), nullable=False)
+    price_paid = db.Column(db.Float, nullable=False)
+    passenger_name = db.Column(db.String(128), nullable=False)
+    passenger_age = db.Column(db.Integer, nullable=False)
+    passenger_gender = db.Column(db.String(10), nullable=False)
+    contact_number = db.Column(db.String(15))
+    status = db.Column(db.String(20))
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def _repr_(self):
+        return f'<BookingArchive {self.archive_id} booking={self.id}>'
+
+class FlightStats(db.Model):
+    # Per-flight load factor and revenue, materialised by the analytics job
+    flight_id = db.Column(db.Integer, primary_key=True)
+    flight_number = db.Column(db.String(10), nullable=False)
+    origin = db.Column(db.String(64), nullable=False)
+    destination = db.Column(db.String(64), nullable=False)
+    departure_time = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20))
+    capacity_economy = db.Column(db.Integer, nullable=False)
+    capacity_premium = db.Column(db.Integer, nullable=False)
+    capacity_business = db.Column(db.Integer, nullable=False)
+    sold_economy = db.Column(db.Integer, nullable=False)
+    sold_premium = db.Column(db.Integer, nullable=False)
+    sold_business = db.Column(db.Integer, nullable=False)
+    revenue_economy = db.Column(db.Float, nullable=False)
+    revenue_premium = db.Column(db.Float, nullable=False)
+    revenue_business = db.Column(db.Float, nullable=False)
+    load_factor = db.Column(db.Float, nullable=False, index=True)
+
+    __table_args__ = (db.Index('ix_flight_stats_route', 'origin', 'destination'),)
+
+    def _repr_(self):
+        return f'<FlightStats {self.flight_id}>'
+
+class RouteStats(db.Model):
+    # Flight stats and archived route totals rolled up per route, rebuilt for
+    # the routes that changed
+    origin = db.Column(db.String(64), primary_key=True)
+    destination = db.Column(db.String(64), primary_key=True)
+    flights = db.Column(db.Integer, nullable=False)
+    capacity = db.Column(db.Integer, nullable=False)
+    seats_sold = db.Column(db.Integer, nullable=False)
+    load_factor = db.Column(db.Float, nullable=False, index=True)
+    capacity_economy = db.Column(db.Integer, nullable=False)
+    capacity_premium = db.Column(db.Integer, nullable=False)
+    capacity_business = db.Column(db.Integer, nullable=False)
+    sold_economy = db.Column(db.Integer, nullable=False)
+    sold_premium = db.Column(db.Integer, nullable=False)
+    sold_business = db.Column(db.Integer, nullable=False)
+    revenue_economy = db.Column(db.Float, nullable=False)
+    revenue_premium = db.Column(db.Float, nullable=False)
+    revenue_business = db.Column(db.Float, nullable=False)
+
+    def _repr_(self):
+        return f'<RouteStats {self.origin}-{self.destination}>'
+
+class ArchivedRouteStats(db.Model):
+    # Stats of archived flights summed per route; flights are added when they
+    # are archived and never recomputed
+    origin = db.Column(db.String(64), primary_key=True)
+    destination = db.Column(db.String(64), primary_key=True)
+    flights = db.Column(db.Integer, nullable=False)
+    capacity_economy = db.Column(db.Integer, nullable=False)
+    capacity_premium = db.Column(db.Integer, nullable=False)
+    capacity_business = db.Column(db.Integer, nullable=False)
+    sold_economy = db.Column(db.Integer, nullable=False)
+    sold_premium = db.Column(db.Integer, nullable=False)
+    sold_business = db.Column(db.Integer, nullable=False)
+    revenue_economy = db.Column(db.Float, nullable=False)
+    revenue_premium = db.Column(db.Float, nullable=False)
+    revenue_business = db.Column(db.Float, nullable=False)
+
+    def _repr_(self):
+        return f'<ArchivedRouteStats {self.origin}-{self.destination}>'
+
+class AnalyticsTotals(db.Model):
+    # Network-wide totals per class, summed from RouteStats on each refresh;
+    # a single row with id 1
+    id = db.Column(db.Integer, primary_key=True)
+    flights = db.Column(db.Integer, nullable=False)
+    capacity_economy = db.Column(db.Integer, nullable=False)
+    capacity_premium = db.Column(db.Integer, nullable=False)
+    capacity_business = db.Column(db.Integer, nullable=False)
+    sold_economy = db.Column(db.Integer, nullable=False)
+    sold_premium = db.Column(db.Integer, nullable=False)
+    sold_business = db.Column(db.Integer, nullable=False)
+    revenue_economy = db.Column(db.Float, nullable=False)
+    revenue_premium = db.Column(db.Float, nullable=False)
+    revenue_business = db.Column(db.Float, nullable=False)
+
+    def _repr_(self):
+        return f'<AnalyticsTotals {self.flights} flights>'
+
+class BookingPace(db.Model):
+    # Bookings made per day and class over the recent window
+    day = db.Column(db.Date, primary_key=True)
+    travel_class = db.Column(db.String(20), primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False)
+    revenue = db.Column(db.Float, nullable=False)
+
+    def _repr_(self):
+        return f'<BookingPace {self.day} {self.travel_class}>'
+
+class AnalyticsWatermark(db.Model):
+    # Last flight data version folded into the analytics summary tables
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def _repr_(self):
+        return f'<AnalyticsWatermark {self.name}={self.version}>'
@@ -0,0 +1,286 @@
+"""Dynamic fare engine.
+
+Fares for every upcoming flight are recomputed in a single vectorised NumPy
+pass from the seat load factor and the number of days left to departure.
+Each class fare is ``base fare * load factor multiplier * days multiplier``,
+where both multipliers are read off piecewise-linear fare curves that can be
+overridden through ``app.config['FARE_CURVES']``.
+
+Base fares and seat capacity live in ``FareBasis`` so that repeated runs
+always start from the original fare instead of compounding adjustments.
+
+With ``PRICING_INTERVAL_SECONDS`` set, every serving process schedules the
+repricing, but each interval's run is claimed through a ``ScheduledJob`` row,
+so only one worker scans the flight table per interval.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+import numpy as np
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from cache import record_flight_changes_by_id
+from models import Booking, FareBasis, Flight, ScheduledJob
+
+logger = logging.getLogger(__name__)
+
+TRAVEL_CLASSES = ('economy', 'premium', 'business')
+
+# Curves are (x points, multiplier points) pairs interpolated with np.interp.
+# Values outside the x range are clamped to the first/last multiplier.
+DEFAULT_FARE_CURVES = {
+    'load_factor': {
+        'economy': ([0.0, 0.5, 0.8, 0.95, 1.0], [0.85, 1.0, 1.2, 1.5, 1.8]),
+        'premium': ([0.0, 0.5, 0.8, 0.95, 1.0], [0.9, 1.0, 1.15, 1.4, 1.6]),
+        'business': ([0.0, 0.5, 0.8, 0.95, 1.0], [0.95, 1.0, 1.1, 1.3, 1.5]),
+    },
+    'days_to_departure': ([0, 3, 7, 14, 30, 60], [1.6, 1.35, 1.15, 1.0, 0.95, 0.9]),
+    # Hard limits relative to the base fare
+    'min_multiplier': 0.5,
+    'max_multiplier': 3.0,
+}
+
+
+SCHEDULED_JOB = 'pricing'
+
+
+def get_fare_curves(app):
+    # Overrides replace top-level entries, except that the load factor
+    # curves are merged per class
+    overrides = app.config.get('FARE_CURVES') or {}
+    curves = dict(DEFAULT_FARE_CURVES)
+    curves.update(overrides)
+    curves['load_factor'] = {**DEFAULT_FARE_CURVES['load_factor'], **overrides.get('load_factor', {})}
+    return curves
+
+
+def _booked_seats(travel_class):
+    # Correlated subquery counting confirmed bookings of one class on a flight
+    return (
+        select(func.count(Booking.id))
+        .where(
+            Booking.flight_id == Flight.id,
+            Booking.travel_class == travel_class,
+            Booking.status == 'Confirmed',
+        )
+        .scalar_subquery()
+    )
+
+
+def seed_fare_basis():
+    """Create ``FareBasis`` rows for flights that don't have one yet.
+
+    The current fares become the base fares, and capacity is the number of
+    seats still available plus the seats already sold. Runs as a single
+    INSERT ... SELECT.
+    """
+    missing = (
+        select(
+            Flight.id,
+            Flight.economy_price,
+            Flight.premium_price,
+            Flight.business_price,
+            Flight.available_seats_economy + _booked_seats('economy'),
+            Flight.available_seats_premium + _booked_seats('premium'),
+            Flight.available_seats_business + _booked_seats('business'),
+        )
+        .outerjoin(FareBasis, FareBasis.flight_id == Flight.id)
+        .where(FareBasis.flight_id.is_(None))
+    )
+    result = db.session.execute(
+        insert(FareBasis).from_select(
+            [
+                'flight_id',
+                'base_economy_price',
+                'base_premium_price',
+                'base_business_price',
+                'capacity_economy',
+                'capacity_premium',
+                'capacity_business',
+            ],
+            missing,
+        )
+    )
+    return result.rowcount
+
+
+def load_inventory(now):
+    """Fetch pricing inputs for all upcoming flights as NumPy columns."""
+    rows = db.session.execute(
+        select(
+            Flight.id,
+            Flight.departure_time,
+            Flight.available_seats_economy,
+            Flight.available_seats_premium,
+            Flight.available_seats_business,
+            Flight.economy_price,
+            Flight.premium_price,
+            Flight.business_price,
+            FareBasis.capacity_economy,
+            FareBasis.capacity_premium,
+            FareBasis.capacity_business,
+            FareBasis.base_economy_price,
+            FareBasis.base_premium_price,
+            FareBasis.base_business_price,
+        )
+        .join(FareBasis, FareBasis.flight_id == Flight.id)
+        .where(and_(Flight.departure_time > now, Flight.status != 'Cancelled'))
+    ).all()
+
+    if not rows:
+        return None
+
+    columns = list(zip(*rows))
+    return {
+        'id': np.array(columns[0], dtype=np.int64),
+        'departure': np.array(columns[1], dtype='datetime64[s]'),
+        'available': np.array(columns[2:5], dtype=np.float64),
+        'price': np.array(columns[5:8], dtype=np.float64),
+        'capacity': np.array(columns[8:11], dtype=np.float64),
+        'base': np.array(columns[11:14], dtype=np.float64),
+    }
+
+
+def compute_fares(inventory, now, curves):
+    """Return a (3, n) array of fares, one row per travel class."""
+    available = np.nan_to_num(inventory['available'])
+    capacity = inventory['capacity']
+
+    # Flights with no capacity in a class are treated as full
+    with np.errstate(divide='ignore', invalid='ignore'):
+        load_factor = np.where(capacity > 0, 1.0 - available / capacity, 1.0)
+    load_factor = np.clip(load_factor, 0.0, 1.0)
+
+    # Time to departure is bucketed to whole hours so that back-to-back runs
+    # don't rewrite every fare by a few paise
+    seconds_left = (inventory['departure'] - np.datetime64(now, 's')).astype(np.float64)
+    days_left = np.floor(seconds_left / 3600.0) / 24.0
+    days_x, days_y = curves['days_to_departure']
+    days_multiplier = np.interp(days_left, days_x, days_y)
+
+    fares = np.empty_like(inventory['base'])
+    for row, travel_class in enumerate(TRAVEL_CLASSES):
+        lf_x, lf_y = curves['load_factor'][travel_class]
+        multiplier = np.interp(load_factor[row], lf_x, lf_y) * days_multiplier
+        multiplier = np.clip(multiplier, curves['min_multiplier'], curves['max_multiplier'])
+        fares[row] = inventory['base'][row] * multiplier
+
+    return np.round(fares, 2)
+
+
+def reprice_all_flights(app, now=None):
+    """Recompute fares for every upcoming flight and write back the changes.
+
+    Only flights whose fare moved by at least one paisa are updated, using a
+    single executemany UPDATE keyed on the primary key.
+    """
+    now = now or datetime.now()
+    seeded = seed_fare_basis()
+
+    inventory = load_inventory(now)
+    if inventory is None:
+        db.session.commit()
+        return 0
+
+    fares = compute_fares(inventory, now, get_fare_curves(app))
+    changed = np.any(np.abs(fares - inventory['price']) >= 0.01, axis=0)
+    changed_ids = inventory['id'][changed]
+
+    if changed_ids.size:
+        changed_fares = fares[:, changed]
+        db.session.execute(
+            update(Flight),
+            [
+                {
+                    'id': flight_id,
+                    'economy_price': economy,
+                    'premium_price': premium,
+                    'business_price': business,
+                }
+                for flight_id, economy, premium, business in zip(
+                    changed_ids.tolist(), *changed_fares.tolist()
+                )
+            ],
+        )
+        record_flight_changes_by_id(changed_ids.tolist())
+
+    db.session.commit()
+    logger.info(
+        "Repriced %d of %d flights (%d new fare bases)",
+        changed_ids.size, inventory['id'].size, seeded,
+    )
+    return int(changed_ids.size)
+
+
+def claim_scheduled_run(name, interval, now=None):
+    """Claim this interval's run of a job; True for at most one caller.
+
+    The claim is a conditional UPDATE of the job's ``ScheduledJob`` row, so
+    concurrent callers in other workers see it and back off.
+    """
+    now = now or datetime.utcnow()
+    if db.session.get(ScheduledJob, name) is None:
+        try:
+            db.session.add(ScheduledJob(name=name))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+
+    claimed = db.session.execute(
+        update(ScheduledJob)
+        .where(
+            ScheduledJob.name == name,
+            or_(ScheduledJob.last_run_at.is_(None), ScheduledJob.last_run_at <= now - timedelta(seconds=interval)),
+        )
+        .values(last_run_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return bool(claimed)
+
+
+def start_pricing_scheduler(app, interval):
+    # Background thread that reprices on a fixed interval. Every worker runs
+    # one, and whichever claims the interval first does the work
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    if claim_scheduled_run(SCHEDULED_JOB, interval):
+                        reprice_all_flights(app)
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Scheduled repricing failed")
+
+    thread = threading.Thread(target=run, name='pricing-scheduler', daemon=True)
+    thread.start()
+    return thread
+
+
+def register_pricing(app):
+    @app.cli.command('reprice')
+    def reprice_command():
+        """Recompute fares for all upcoming flights."""
+        start = time.perf_counter()
+        changed = reprice_all_flights(app)
+        click.echo(f"Updated fares on {changed} flights in {time.perf_counter() - start:.2f}s")
+
+    interval = app.config.get('PRICING_INTERVAL_SECONDS', 0)
+    if interval > 0:
+        lock = threading.Lock()
+        scheduler = []
+
+        # Started by the first request, so that `flask` CLI commands, which
+        # load the app but serve nothing, never start one
+        @app.before_request
+        def start_scheduler():
+            if not scheduler:
+                with lock:
+                    if not scheduler:
+                        scheduler.append(start_pricing_scheduler(app, interval))
@@ -1,11 +1,16 @@
 import random
 from datetime import datetime, timedelta
-from flask import render_template, redirect, url_for, flash, request, session, jsonify
+from flask import render_template, redirect, url_for, flash, request, session, jsonify, abort
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash
 from app import db
-from models import User, Flight, Booking
+from sqlalchemy.orm import contains_eager
+from models import User, Flight, Booking, BookingArchive, FlightArchive
 from forms import SignupForm, LoginForm, QuizForm, SearchFlightForm, BookingForm, AddMoneyForm, AddFlightForm
+from cache import fragment_cache, render_cached_fragment, flight_data_version, flight_version
+from snapshot import snapshot as flight_snapshot
+from search import search_flights as cached_search
+from schemas import CONNECTION_PATH_SCHEMA, FLIGHT_PATH_SCHEMA, SCHEDULE_SCHEMA
 from flask_wtf.csrf import generate_csrf
 
 
@@ -256,28 +261,16 @@ def register_routes(app):
     @app.route('/flight_schedules')
     @login_required
     def flight_schedules():
-        # Get all flights
-        flights = Flight.query.all()
-        
-        # Create a JSON-serializable list of flight data
-        serializable_flights = []
-        for flight in flights:
-            serializable_flights.append({
-                'id': flight.id,
-                'flight_number': flight.flight_number,
-                'origin': flight.origin,
-                'destination': flight.destination,
-                'departure_time_str': flight.departure_time.strftime('%d-%b-%Y %H:%M'),
-                'arrival_time_str': flight.arrival_time.strftime('%d-%b-%Y %H:%M'),
-                'duration_hours': ((flight.arrival_time - flight.departure_time).total_seconds() / 3600),
-                'status': flight.status,
-                'economy_price': flight.economy_price,
-                'premium_price': flight.premium_price,
-                'business_price': flight.business_price,
-                'aircraft_type': flight.aircraft_type
-            })
-        
-        return render_template('flight_schedules.html', flights=flights, flight_data=serializable_flights)
+        # The table is the same for every user until a flight changes, so it is
+        # rendered once per flight table version and a cache hit skips the query
+        def render_schedule():
+            # Get all flights
+            flights = flight_snapshot.all()
+            
+            return render_template('fragments/flight_schedules.html', flights=flights, flight_data=SCHEDULE_SCHEMA.dump_many(flights))
+        
+        fragment = fragment_cache.get_or_render(f'flight_schedules:v{flight_data_version()}', render_schedule)
+        return render_template('flight_schedules.html', fragment=fragment)
     
     @app.route('/search_flights', methods=['GET', 'POST'])
     @login_required
@@ -295,19 +288,10 @@ def register_routes(app):
             origin = origin.title()
             destination = destination.title()
             
-            # Search for direct flights - exact match first, then partial match
-            # First try exact match
-            direct_flights = Flight.query.filter(
-                db.func.lower(Flight.origin) == origin.lower(),
-                db.func.lower(Flight.destination) == destination.lower()
-            ).all()
-            
-            # If no exact matches, try partial matches
-            if not direct_flights:
-                direct_flights = Flight.query.filter(
-                    Flight.origin.ilike(f"%{origin}%"), 
-                    Flight.destination.ilike(f"%{destination}%")
-                ).all()
+            # Direct flights (exact match first, then partial match), or
+            # connecting flights when there are none; served from the search
+            # cache when nothing on this route changed since the last search
+            direct_flights, connecting_flights, complete = cached_search(origin, destination)
             
             print(f"Found {len(direct_flights)} direct flights")
             
@@ -316,73 +300,40 @@ def register_routes(app):
                 return render_template('search_flights.html', form=form, direct_flights=direct_flights, 
                                       origin=origin, destination=destination)
             
-            # If no direct flights, find connecting flights
-            connecting_flights = []
-            
-            # Find flights from origin to any city - try exact match first
-            first_leg_flights = Flight.query.filter(
-                db.func.lower(Flight.origin) == origin.lower()
-            ).all()
-            
-            # If no exact matches, try partial matches
-            if not first_leg_flights:
-                first_leg_flights = Flight.query.filter(
-                    Flight.origin.ilike(f"%{origin}%")
-                ).all()
-                
-            print(f"Found {len(first_leg_flights)} potential first legs")
-            
-            for first_leg in first_leg_flights:
-                # Find flights from the connection city to the destination - exact match on connection city
-                connection_city = first_leg.destination
-                
-                # Try exact match for second leg
-                second_leg_flights = Flight.query.filter(
-                    db.func.lower(Flight.origin) == connection_city.lower(),
-                    db.func.lower(Flight.destination) == destination.lower()
-                ).all()
-                
-                # If no exact matches, try partial matches for destination only
-                if not second_leg_flights:
-                    second_leg_flights = Flight.query.filter(
-                        db.func.lower(Flight.origin) == connection_city.lower(),
-                        Flight.destination.ilike(f"%{destination}%")
-                    ).all()
-                
-                print(f"Found {len(second_leg_flights)} potential second legs from {connection_city}")
-                
-                for second_leg in second_leg_flights:
-                    # Ensure there's enough connection time (at least 2 hours)
-                    if second_leg.departure_time > (first_leg.arrival_time + timedelta(hours=2)):
-                        connecting_flights.append({
-                            'first_leg': first_leg,
-                            'second_leg': second_leg,
-                            'total_duration': (second_leg.arrival_time - first_leg.departure_time).total_seconds() / 3600,
-                            'connection_time': (second_leg.departure_time - first_leg.arrival_time).total_seconds() / 3600,
-                            'total_price_economy': first_leg.economy_price + second_leg.economy_price,
-                            'total_price_premium': first_leg.premium_price + second_leg.premium_price,
-                            'total_price_business': first_leg.business_price + second_leg.business_price
-                        })
-            
             print(f"Found {len(connecting_flights)} valid connecting flights")
             
             return render_template('search_flights.html', form=form, connecting_flights=connecting_flights,
-                                  direct_flights=direct_flights, origin=origin, destination=destination)
+                                  direct_flights=direct_flights, origin=origin, destination=destination,
+                                  partial_results=not complete)
         
         return render_template('search_flights.html', form=form)
     
     @app.route('/flight_details/<int:flight_id>')
     @login_required
     def flight_details(flight_id):
-        flight = Flight.query.get_or_404(flight_id)
-        return render_template('flight_details.html', flight=flight)
+        fragment = render_cached_fragment(
+            f'flight_details:{flight_id}:v{flight_version(flight_id)}',
+            'fragments/flight_details.html',
+            flight=lambda: flight_snapshot.get(flight_id) or abort(404),
+        )
+        return render_template('flight_details.html', fragment=fragment)
     
     @app.route('/book_flight/<int:flight_id>', methods=['GET', 'POST'])
     @login_required
     def book_flight(flight_id):
-        flight = Flight.query.get_or_404(flight_id)
+        # Bookings lock the flight, so the checks below cannot race a
+        # cancellation, the archive job or another booking of the same flight
+        flight = db.session.get(Flight, flight_id, with_for_update=request.method == 'POST') or abort(404)
         form = BookingForm(flight_id=flight_id)
         
+        if flight.status == 'Cancelled':
+            flash(f'Flight {flight.flight_number} has been cancelled and can no longer be booked.', 'danger')
+            return redirect(url_for('flight_details', flight_id=flight_id))
+
+        if flight.departure_time <= datetime.now():
+            flash(f'Flight {flight.flight_number} has already departed and can no longer be booked.', 'danger')
+            return redirect(url_for('flight_details', flight_id=flight_id))
+        
         if form.validate_on_submit():
             travel_class = form.travel_class.data
             
@@ -432,9 +383,36 @@ def register_routes(app):
     @app.route('/my_bookings')
     @login_required
     def my_bookings():
-        bookings = Booking.query.filter_by(user_id=current_user.id).all()
+        # Only upcoming trips; past trips are listed on the booking history page
+        now = datetime.utcnow()
+        bookings = (Booking.query.join(Booking.flight)
+                    .options(contains_eager(Booking.flight))
+                    .filter(Booking.user_id == current_user.id, Flight.departure_time > now)
+                    .order_by(Flight.departure_time)
+                    .all())
         csrf_token = generate_csrf()
-        return render_template('my_bookings.html', bookings=bookings, csrf_token=csrf_token, now=datetime.utcnow())
+        return render_template('my_bookings.html', bookings=bookings, csrf_token=csrf_token, now=now)
+
+    @app.route('/my_bookings/history')
+    @login_required
+    def booking_history():
+        now = datetime.utcnow()
+        
+        # Departed flights that have not been archived yet
+        recent_trips = (Booking.query.join(Booking.flight)
+                        .options(contains_eager(Booking.flight))
+                        .filter(Booking.user_id == current_user.id, Flight.departure_time <= now)
+                        .order_by(Flight.departure_time.desc())
+                        .all())
+        
+        # Older trips from the archive
+        archived_trips = (BookingArchive.query.join(BookingArchive.flight)
+                          .options(contains_eager(BookingArchive.flight))
+                          .filter(BookingArchive.user_id == current_user.id)
+                          .order_by(FlightArchive.departure_time.desc())
+                          .all())
+        
+        return render_template('booking_history.html', bookings=recent_trips + archived_trips)
 
 
     @app.route('/cancel_booking/<int:booking_id>', methods=['POST'])
@@ -447,6 +425,11 @@ def register_routes(app):
             flash('Unauthorized access.', 'danger')
             return redirect(url_for('my_bookings'))
         
+        # Bookings on operationally cancelled flights were already refunded in full
+        if booking.status != 'Confirmed':
+            flash('This booking has already been cancelled.', 'info')
+            return redirect(url_for('my_bookings'))
+        
         # Calculate refund amount (50% of the ticket price)
         refund_amount = booking.price_paid * 0.5
         
@@ -551,113 +534,14 @@ def register_routes(app):
     @app.route('/get_flight_path/<int:flight_id>')
     @login_required
     def get_flight_path(flight_id):
-        flight = Flight.query.get_or_404(flight_id)
-        
-        # This is a simplified version - in a real application, you would use a geocoding API
-        # to get actual coordinates for origin and destination cities
-        # For now, we'll use a static mapping for demonstration
-        city_coords = {
-            'Mumbai': [19.0760, 72.8777],
-            'Delhi': [28.7041, 77.1025],
-            'Bangalore': [12.9716, 77.5946],
-            'Chennai': [13.0827, 80.2707],
-            'Kolkata': [22.5726, 88.3639],
-            'Hyderabad': [17.3850, 78.4867],
-            'Ahmedabad': [23.0225, 72.5714],
-            'Pune': [18.5204, 73.8567],
-            'Jaipur': [26.9124, 75.7873],
-            'Lucknow': [26.8467, 80.9462],
-            'London': [51.5074, -0.1278],
-            'New York': [40.7128, -74.0060],
-            'Paris': [48.8566, 2.3522],
-            'Tokyo': [35.6762, 139.6503],
-            'Dubai': [25.2048, 55.2708],
-            'Singapore': [1.3521, 103.8198],
-            'Sydney': [-33.8688, 151.2093],
-            'Toronto': [43.6532, -79.3832],
-            'Berlin': [52.5200, 13.4050],
-            'Rome': [41.9028, 12.4964]
-        }
-        
-        # Default coordinates if city not found
-        origin_coords = city_coords.get(flight.origin, [0, 0])
-        dest_coords = city_coords.get(flight.destination, [0, 0])
-        
-        flight_data = {
-            'origin': {
-                'name': flight.origin,
-                'coords': origin_coords
-            },
-            'destination': {
-                'name': flight.destination,
-                'coords': dest_coords
-            },
-            'flight_number': flight.flight_number,
-            'distance_km': flight.distance_km,
-            'duration_hours': (flight.arrival_time - flight.departure_time).total_seconds() / 3600
-        }
-        
-        return jsonify(flight_data)
+        flight = flight_snapshot.get(flight_id) or abort(404)
+        
+        return jsonify(FLIGHT_PATH_SCHEMA.dump(flight))
     
     @app.route('/get_connecting_flight_path/<int:first_leg_id>/<int:second_leg_id>')
     @login_required
     def get_connecting_flight_path(first_leg_id, second_leg_id):
-        first_leg = Flight.query.get_or_404(first_leg_id)
-        second_leg = Flight.query.get_or_404(second_leg_id)
-        
-        # City coordinates mapping (simplified version)
-        city_coords = {
-            'Mumbai': [19.0760, 72.8777],
-            'Delhi': [28.7041, 77.1025],
-            'Bangalore': [12.9716, 77.5946],
-            'Chennai': [13.0827, 80.2707],
-            'Kolkata': [22.5726, 88.3639],
-            'Hyderabad': [17.3850, 78.4867],
-            'Ahmedabad': [23.0225, 72.5714],
-            'Pune': [18.5204, 73.8567],
-            'Jaipur': [26.9124, 75.7873],
-            'Lucknow': [26.8467, 80.9462],
-            'London': [51.5074, -0.1278],
-            'New York': [40.7128, -74.0060],
-            'Paris': [48.8566, 2.3522],
-            'Tokyo': [35.6762, 139.6503],
-            'Dubai': [25.2048, 55.2708],
-            'Singapore': [1.3521, 103.8198],
-            'Sydney': [-33.8688, 151.2093],
-            'Toronto': [43.6532, -79.3832],
-            'Berlin': [52.5200, 13.4050],
-            'Rome': [41.9028, 12.4964]
-        }
-        
-        # Get coordinates for all three cities
-        origin_coords = city_coords.get(first_leg.origin, [0, 0])
-        connection_coords = city_coords.get(first_leg.destination, [0, 0])
-        destination_coords = city_coords.get(second_leg.destination, [0, 0])
-        
-        connection_data = {
-            'origin': {
-                'name': first_leg.origin,
-                'coords': origin_coords
-            },
-            'connection': {
-                'name': first_leg.destination,
-                'coords': connection_coords
-            },
-            'destination': {
-                'name': second_leg.destination,
-                'coords': destination_coords
-            },
-            'first_leg': {
-                'flight_number': first_leg.flight_number,
-                'distance_km': first_leg.distance_km,
-                'duration_hours': (first_leg.arrival_time - first_leg.departure_time).total_seconds() / 3600
-            },
-            'second_leg': {
-                'flight_number': second_leg.flight_number,
-                'distance_km': second_leg.distance_km,
-                'duration_hours': (second_leg.arrival_time - second_leg.departure_time).total_seconds() / 3600
-            },
-            'connection_time_hours': (second_leg.departure_time - first_leg.arrival_time).total_seconds() / 3600
-        }
-        
-        return jsonify(connection_data)
+        first_leg = flight_snapshot.get(first_leg_id) or abort(404)
+        second_leg = flight_snapshot.get(second_leg_id) or abort(404)
+        
+        return jsonify(CONNECTION_PATH_SCHEMA.dump((first_leg, second_leg)))
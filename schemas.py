@@ -0,0 +1,181 @@
+"""Serialisation schemas for the JSON API and the JSON embedded in pages.
+
+A schema maps output field names to functions of the object being dumped, so
+the same schema works for ``Flight`` rows and snapshot ``FlightRecord``
+tuples. Every flight serialisation lives here rather than in the views.
+``dumps`` encodes with orjson when it is installed and falls back to the
+standard library otherwise; both produce compact UTF-8 bytes.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(data):
+    """Encode ``data`` as compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def join_array(payloads):
+    """A JSON array built from already encoded items."""
+    return b'[' + b','.join(payloads) + b']'
+
+
+def join_object(**parts):
+    """A JSON object whose values are already encoded bytes."""
+    return b'{' + b','.join(dumps(name) + b':' + value for name, value in parts.items()) + b'}'
+
+
+def attr(name, convert=None):
+    if convert is None:
+        return lambda obj: getattr(obj, name)
+
+    def read(obj):
+        value = getattr(obj, name)
+        return None if value is None else convert(value)
+    return read
+
+
+def isoformat(value):
+    return value.isoformat()
+
+
+def strftime(fmt):
+    return lambda value: value.strftime(fmt)
+
+
+def per_class(prefix, suffix=''):
+    # {'economy': obj.<prefix>economy<suffix>, ...}
+    return lambda obj: {
+        travel_class: getattr(obj, f'{prefix}{travel_class}{suffix}')
+        for travel_class in ('economy', 'premium', 'business')
+    }
+
+
+class Schema:
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def dump(self, obj):
+        return {name: read(obj) for name, read in self.fields.items()}
+
+    def dump_many(self, objs):
+        return [self.dump(obj) for obj in objs]
+
+
+# Map coordinates of the cities we fly to; unknown cities are drawn at [0, 0]
+CITY_COORDS = {
+    'Mumbai': [19.0760, 72.8777],
+    'Delhi': [28.7041, 77.1025],
+    'Bangalore': [12.9716, 77.5946],
+    'Chennai': [13.0827, 80.2707],
+    'Kolkata': [22.5726, 88.3639],
+    'Hyderabad': [17.3850, 78.4867],
+    'Ahmedabad': [23.0225, 72.5714],
+    'Pune': [18.5204, 73.8567],
+    'Jaipur': [26.9124, 75.7873],
+    'Lucknow': [26.8467, 80.9462],
+    'London': [51.5074, -0.1278],
+    'New York': [40.7128, -74.0060],
+    'Paris': [48.8566, 2.3522],
+    'Tokyo': [35.6762, 139.6503],
+    'Dubai': [25.2048, 55.2708],
+    'Singapore': [1.3521, 103.8198],
+    'Sydney': [-33.8688, 151.2093],
+    'Toronto': [43.6532, -79.3832],
+    'Berlin': [52.5200, 13.4050],
+    'Rome': [41.9028, 12.4964],
+}
+
+
+def _city(name):
+    return {'name': name, 'coords': CITY_COORDS.get(name, [0, 0])}
+
+
+def city(name):
+    return lambda obj: _city(getattr(obj, name))
+
+
+def _hours(start, end):
+    return (end - start).total_seconds() / 3600
+
+
+def _flight_hours(flight):
+    return _hours(flight.departure_time, flight.arrival_time)
+
+
+def _duration_hours(flight):
+    return round(_flight_hours(flight), 2)
+
+
+FLIGHT_SCHEMA = Schema(
+    id=attr('id'),
+    flight_number=attr('flight_number'),
+    origin=attr('origin'),
+    destination=attr('destination'),
+    departure_time=attr('departure_time', isoformat),
+    arrival_time=attr('arrival_time', isoformat),
+    duration_hours=_duration_hours,
+    status=attr('status'),
+    prices=per_class('', '_price'),
+    available_seats=per_class('available_seats_'),
+    aircraft_type=attr('aircraft_type'),
+    distance_km=attr('distance_km'),
+)
+
+BOOKING_SCHEMA = Schema(
+    id=attr('id'),
+    flight_id=attr('flight_id'),
+    booking_date=attr('booking_date', isoformat),
+    travel_class=attr('travel_class'),
+    seat_number=attr('seat_number'),
+    price_paid=attr('price_paid'),
+    passenger_name=attr('passenger_name'),
+    passenger_age=attr('passenger_age'),
+    passenger_gender=attr('passenger_gender'),
+    status=attr('status'),
+)
+
+# Rows of the flight schedules table, embedded in the page for its filters
+SCHEDULE_SCHEMA = Schema(
+    id=attr('id'),
+    flight_number=attr('flight_number'),
+    origin=attr('origin'),
+    destination=attr('destination'),
+    departure_time_str=attr('departure_time', strftime('%d-%b-%Y %H:%M')),
+    arrival_time_str=attr('arrival_time', strftime('%d-%b-%Y %H:%M')),
+    duration_hours=_flight_hours,
+    status=attr('status'),
+    economy_price=attr('economy_price'),
+    premium_price=attr('premium_price'),
+    business_price=attr('business_price'),
+    aircraft_type=attr('aircraft_type'),
+)
+
+# Route maps (static/js/map.js)
+LEG_SCHEMA = Schema(
+    flight_number=attr('flight_number'),
+    distance_km=attr('distance_km'),
+    duration_hours=_flight_hours,
+)
+
+FLIGHT_PATH_SCHEMA = Schema(
+    origin=city('origin'),
+    destination=city('destination'),
+    **LEG_SCHEMA.fields,
+)
+
+# Dumps a (first leg, second leg) pair
+CONNECTION_PATH_SCHEMA = Schema(
+    origin=lambda legs: _city(legs[0].origin),
+    connection=lambda legs: _city(legs[0].destination),
+    destination=lambda legs: _city(legs[1].destination),
+    first_leg=lambda legs: LEG_SCHEMA.dump(legs[0]),
+    second_leg=lambda legs: LEG_SCHEMA.dump(legs[1]),
+    connection_time_hours=lambda legs: _hours(legs[0].arrival_time, legs[1].departure_time),
+)
@@ -0,0 +1,159 @@
+"""Flight search with a result cache.
+
+Search results are cached per worker under the normalised (origin,
+destination) pair plus the route version from the flight snapshot, which
+moves whenever a flight leaving the origin or arriving at the destination
+changes (new flights, bookings, status or fare changes). Only flight ids are
+cached; records are re-read from the snapshot on every hit.
+
+Concurrent misses for the same key are coalesced: the first request runs
+the search and the others wait for its result instead of repeating it.
+
+Direct searches run inline. Connecting searches have a deadline and a cap
+on the number of connections returned, and the expensive ones are sent to
+the itinerary process pool; results cut short by either limit are returned
+but not cached.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app, jsonify
+
+from auth import operator_required
+from cache import LRUCache, fragment_cache
+from itineraries import connection_pairs, itinerary_pool
+from snapshot import snapshot
+
+MIN_CONNECTION_HOURS = 2
+
+SearchResult = namedtuple('SearchResult', ['direct_ids', 'connection_ids', 'complete'])
+
+
+class _PendingSearch:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SearchCache:
+    def __init__(self, max_entries=2048):
+        # Every entry counts as one, so max_bytes bounds the entry count too
+        self.results = LRUCache(max_entries, max_entries, sizeof=lambda value: 1)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def configure(self, max_entries):
+        self.results = LRUCache(max_entries, max_entries, sizeof=lambda value: 1)
+
+    def get_or_compute(self, key, compute, should_cache=None):
+        result = self.results.get(key)
+        if result is not None:
+            with self._lock:
+                self.hits += 1
+            return result
+
+        with self._lock:
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = _PendingSearch()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.result
+
+        try:
+            pending.result = compute()
+            if should_cache is None or should_cache(pending.result):
+                self.results.set(key, pending.result)
+            return pending.result
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.done.set()
+
+    def stats(self):
+        with self._lock:
+            hits, misses, coalesced = self.hits, self.misses, self.coalesced
+        total = hits + misses + coalesced
+        return {
+            'entries': len(self.results),
+            'hits': hits,
+            'misses': misses,
+            'coalesced': coalesced,
+            # Coalesced requests were served without their own computation
+            'hit_rate': round((hits + coalesced) / total, 4) if total else 0.0,
+        }
+
+
+search_cache = SearchCache()
+
+
+def normalise_city(city):
+    return ' '.join(city.split()).lower()
+
+
+def find_itineraries(origin, destination):
+    """Search the snapshot for direct flights, or connections if there are none."""
+    columns = snapshot.refresh()
+    direct_ids = snapshot.direct_ids(origin, destination, columns)
+    if direct_ids:
+        return SearchResult(direct_ids, [], True)
+
+    config = current_app.config
+    first_legs, exact_second, partial_second = snapshot.connection_candidates(origin, destination, columns)
+    args = (first_legs, exact_second, partial_second, MIN_CONNECTION_HOURS * 3600)
+    limits = {
+        'max_results': config['SEARCH_MAX_CONNECTIONS'],
+        'deadline': time.time() + config['SEARCH_DEADLINE_SECONDS'],
+    }
+    # Pairs that would have to be examined in the worst case
+    if itinerary_pool.enabled and first_legs.size * partial_second.size >= config['SEARCH_OFFLOAD_MIN_PAIRS']:
+        connection_ids, complete = itinerary_pool.search(columns.arrays, columns.schedule_version, *args, **limits)
+    else:
+        connection_ids, complete = connection_pairs(columns.arrays, *args, **limits)
+    return SearchResult([], connection_ids, complete)
+
+
+def search_flights(origin, destination):
+    """Return (direct flights, connecting flights, complete) for a search.
+
+    Direct flights are ``FlightRecord`` tuples and connections are dicts with
+    both legs, as rendered by search_flights.html. ``complete`` is False when
+    the connections were cut short by the deadline or the result cap.
+    """
+    origin, destination = normalise_city(origin), normalise_city(destination)
+    version = snapshot.route_version(origin, destination)
+    key = (origin, destination, version)
+    result = search_cache.get_or_compute(
+        key, lambda: find_itineraries(origin, destination), should_cache=lambda result: result.complete)
+    direct, connections = snapshot.hydrate(result.direct_ids, result.connection_ids)
+    return direct, connections, result.complete
+
+
+def register_search(app):
+    search_cache.configure(app.config['SEARCH_CACHE_MAX_ENTRIES'])
+    itinerary_pool.configure(app.config['SEARCH_POOL_WORKERS'],
+                             directory=app.config['SEARCH_TIMETABLE_DIR'])
+
+    @app.route('/admin/cache_stats')
+    @operator_required
+    def cache_stats():
+        return jsonify({
+            'search': search_cache.stats(),
+            'fragments': fragment_cache.stats(),
+            'itineraries': itinerary_pool.stats(),
+        })
@@ -0,0 +1,367 @@
+"""Read-only columnar snapshot of the flight table.
+
+Read paths (schedules, search, flight details, map APIs) query this
+snapshot instead of hydrating ORM objects. Each worker holds the flights as
+NumPy columns with city, aircraft and status strings interned into integer
+codes, and hands out lightweight ``FlightRecord`` tuples that have the same
+attribute names as ``Flight``, so templates work with either.
+
+The snapshot is refreshed from the flight change log: when the log has moved
+on, only the flights changed since the snapshot's version are re-read.
+Refreshes that add or drop rows build new arrays and swap them in at once.
+Every row carries the version at which it was last written, so callers can
+key cached per-flight output on ``(id, version)``.
+"""
+import logging
+import threading
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import func, select
+
+from app import db
+from cache import flight_data_version
+from itineraries import TIMETABLE_COLUMNS
+from models import Flight, FlightChange
+
+logger = logging.getLogger(__name__)
+
+_FLIGHT_FIELDS = (
+    'id', 'flight_number', 'origin', 'destination', 'departure_time', 'arrival_time',
+    'status', 'economy_price', 'premium_price', 'business_price',
+    'available_seats_economy', 'available_seats_premium', 'available_seats_business',
+    'aircraft_type', 'distance_km',
+)
+
+FlightRecord = namedtuple('FlightRecord', _FLIGHT_FIELDS + ('version',))
+
+_FLIGHT_COLUMNS = [getattr(Flight, name) for name in _FLIGHT_FIELDS]
+
+# Compact the arrays once this share of rows belongs to deleted flights
+_COMPACT_RATIO = 0.25
+
+
+class StringPool:
+    """Interns strings into dense integer codes.
+
+    Codes are never reused, so arrays built against an older pool stay valid.
+    """
+
+    def __init__(self):
+        self.strings = []
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def code(self, value):
+        if value is None:
+            return -1
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self.strings)
+                    self.strings.append(value)
+                    self._codes[value] = code
+        return code
+
+    def value(self, code):
+        return self.strings[code] if code >= 0 else None
+
+    def matching_codes(self, text, partial=False):
+        # Case-insensitive equality, or substring match like ILIKE '%text%'
+        text = text.lower()
+        if partial:
+            return np.array([code for code, value in enumerate(self.strings) if text in value.lower()],
+                            dtype=np.int32)
+        return np.array([code for code, value in enumerate(self.strings) if value.lower() == text],
+                        dtype=np.int32)
+
+
+class _Columns:
+    """One generation of snapshot arrays and their flight id -> row index.
+
+    ``schedule_version`` is the last version at which a timetable column
+    (cities and times) changed, so on-disk timetable copies only need to be
+    rewritten when it moves, not on every booking.
+    """
+
+    def __init__(self, arrays, version):
+        self.arrays = arrays
+        self.version = version
+        self.schedule_version = version
+        self.index = {flight_id: row for row, flight_id in enumerate(arrays['id'].tolist())
+                      if arrays['alive'][row]}
+
+    def __len__(self):
+        return len(self.index)
+
+
+class FlightSnapshot:
+    def __init__(self):
+        self.cities = StringPool()
+        self.aircraft = StringPool()
+        self.statuses = StringPool()
+        self._columns = None
+        self._lock = threading.Lock()
+        # Last version at which a flight from/to each city code changed, so
+        # callers can tell whether results for a route may have changed.
+        # Cities not listed have not changed since the last full load.
+        self._baseline_version = 0
+        self._origin_versions = {}
+        self._destination_versions = {}
+
+    # Loading
+
+    def _encode(self, rows, version):
+        count = len(rows)
+        columns = list(zip(*rows)) if count else [()] * len(_FLIGHT_FIELDS)
+        fields = dict(zip(_FLIGHT_FIELDS, columns))
+        return {
+            'id': np.array(fields['id'], dtype=np.int64),
+            'flight_number': np.array(fields['flight_number'], dtype=object),
+            'origin': np.fromiter((self.cities.code(v) for v in fields['origin']), np.int32, count),
+            'destination': np.fromiter((self.cities.code(v) for v in fields['destination']), np.int32, count),
+            'departure_time': np.array(fields['departure_time'], dtype='datetime64[us]'),
+            'arrival_time': np.array(fields['arrival_time'], dtype='datetime64[us]'),
+            'status': np.fromiter((self.statuses.code(v) for v in fields['status']), np.int32, count),
+            'economy_price': np.array(fields['economy_price'], dtype=np.float64),
+            'premium_price': np.array(fields['premium_price'], dtype=np.float64),
+            'business_price': np.array(fields['business_price'], dtype=np.float64),
+            'available_seats_economy': np.array(fields['available_seats_economy'], dtype=np.float64),
+            'available_seats_premium': np.array(fields['available_seats_premium'], dtype=np.float64),
+            'available_seats_business': np.array(fields['available_seats_business'], dtype=np.float64),
+            'aircraft_type': np.fromiter((self.aircraft.code(v) for v in fields['aircraft_type']), np.int32, count),
+            'distance_km': np.array(fields['distance_km'], dtype=np.float64),
+            'alive': np.ones(count, dtype=bool),
+            # Kept last: rows are overwritten in key order, so a row shows
+            # its new version only once all of its data has been written
+            'version': np.full(count, version, dtype=np.int64),
+        }
+
+    def _load_rows(self, flight_ids=None):
+        query = select(*_FLIGHT_COLUMNS).order_by(Flight.id)
+        if flight_ids is not None:
+            query = query.where(Flight.id.in_(flight_ids))
+        return db.session.execute(query).all()
+
+    def _full_load(self, version):
+        return _Columns(self._encode(self._load_rows(), version), version)
+
+    def _apply_changes(self, columns, version):
+        changed_ids = db.session.scalars(
+            select(FlightChange.flight_id).where(FlightChange.version > columns.version).distinct()
+        ).all()
+        rows = []
+        for start in range(0, len(changed_ids), 500):
+            rows.extend(self._load_rows(changed_ids[start:start + 500]))
+        fresh = self._encode(rows, version)
+
+        # Changed rows are overwritten in place. A reader racing with this may
+        # briefly see one flight half-updated, which is harmless for listings
+        # and avoids copying every column on each refresh. Such a record still
+        # carries its old version, so it is never cached as the new one.
+        arrays = columns.arrays
+        appended = []
+        routes = []
+        schedule_changed = False
+        for position, flight_id in enumerate(fresh['id'].tolist()):
+            routes.append((fresh['origin'][position], fresh['destination'][position]))
+            row = columns.index.get(flight_id)
+            if row is None:
+                appended.append(position)
+                continue
+            routes.append((arrays['origin'][row], arrays['destination'][row]))
+            schedule_changed = schedule_changed or any(
+                arrays[name][row] != fresh[name][position] for name in TIMETABLE_COLUMNS)
+            for name, array in arrays.items():
+                array[row] = fresh[name][position]
+
+        # Flights that changed but no longer exist were deleted
+        found = set(fresh['id'].tolist())
+        for flight_id in changed_ids:
+            if flight_id not in found and flight_id in columns.index:
+                row = columns.index.pop(flight_id)
+                routes.append((arrays['origin'][row], arrays['destination'][row]))
+                arrays['alive'][row] = False
+
+        dead = int((~arrays['alive']).sum())
+        compact = dead > _COMPACT_RATIO * len(arrays['alive'])
+        if not appended and not compact:
+            columns.version = version
+            if schedule_changed:
+                columns.schedule_version = version
+            return columns, routes
+
+        # New flights or compaction need new arrays and a new row index
+        if appended:
+            arrays = {name: np.concatenate([array, fresh[name][appended]]) for name, array in arrays.items()}
+        if compact:
+            keep = arrays['alive']
+            arrays = {name: array[keep] for name, array in arrays.items()}
+        return _Columns(arrays, version), routes
+
+    def refresh(self):
+        """Bring the snapshot up to the current flight change version."""
+        # The version is memoised per request, so a request that started
+        # before another thread refreshed may ask for an older one; the
+        # newer snapshot serves it just as well
+        version = flight_data_version()
+        columns = self._columns
+        if columns is not None and columns.version >= version:
+            return columns
+
+        with self._lock:
+            columns = self._columns
+            if columns is not None and columns.version >= version:
+                return columns
+
+            oldest = db.session.scalar(select(func.min(FlightChange.version))) or 0
+            # A full reload is needed the first time, and when the changes
+            # since our version have already been pruned from the log
+            # Route versions are published only after the data they describe
+            # is visible, so a route key never names data we do not have yet
+            if columns is None or columns.version < oldest - 1:
+                columns = self._full_load(version)
+                self._columns = columns
+                self._baseline_version = version
+                self._origin_versions = {}
+                self._destination_versions = {}
+            else:
+                columns, routes = self._apply_changes(columns, version)
+                self._columns = columns
+                for origin_code, destination_code in routes:
+                    self._touch_route(origin_code, destination_code, version)
+            logger.debug("Flight snapshot at version %s with %d flights", version, len(columns))
+            return columns
+
+    def _touch_route(self, origin_code, destination_code, version):
+        self._origin_versions[int(origin_code)] = version
+        self._destination_versions[int(destination_code)] = version
+
+    def route_version(self, origin, destination):
+        """Version of the data that a search from origin to destination reads.
+
+        Covers every flight a search can touch: flights leaving a city that
+        matches ``origin`` and flights arriving at one matching ``destination``,
+        including partial matches and both legs of connections.
+        """
+        self.refresh()
+        version = self._baseline_version
+        for code in self.cities.matching_codes(origin, partial=True).tolist():
+            version = max(version, self._origin_versions.get(code, 0))
+        for code in self.cities.matching_codes(destination, partial=True).tolist():
+            version = max(version, self._destination_versions.get(code, 0))
+        return version
+
+    # Queries
+
+    def _record(self, arrays, row):
+        def number(value):
+            return None if np.isnan(value) else value.item()
+
+        def count(value):
+            return None if np.isnan(value) else int(value)
+
+        # The version is read first, so a record carrying a row's new version
+        # was built from data written completely before it
+        return FlightRecord(
+            version=int(arrays['version'][row]),
+            id=int(arrays['id'][row]),
+            flight_number=arrays['flight_number'][row],
+            origin=self.cities.value(arrays['origin'][row]),
+            destination=self.cities.value(arrays['destination'][row]),
+            departure_time=arrays['departure_time'][row].item(),
+            arrival_time=arrays['arrival_time'][row].item(),
+            status=self.statuses.value(arrays['status'][row]),
+            economy_price=number(arrays['economy_price'][row]),
+            premium_price=number(arrays['premium_price'][row]),
+            business_price=number(arrays['business_price'][row]),
+            available_seats_economy=count(arrays['available_seats_economy'][row]),
+            available_seats_premium=count(arrays['available_seats_premium'][row]),
+            available_seats_business=count(arrays['available_seats_business'][row]),
+            aircraft_type=self.aircraft.value(arrays['aircraft_type'][row]),
+            distance_km=count(arrays['distance_km'][row]),
+        )
+
+    def records(self, rows, columns=None):
+        columns = columns or self.refresh()
+        return [self._record(columns.arrays, row) for row in rows]
+
+    def get(self, flight_id):
+        columns = self.refresh()
+        row = columns.index.get(flight_id)
+        return None if row is None else self._record(columns.arrays, row)
+
+    def all(self):
+        columns = self.refresh()
+        return self.records(np.flatnonzero(columns.arrays['alive']), columns)
+
+    def match(self, origin=None, destination=None, partial=False, columns=None):
+        """Return row numbers of flights matching origin and/or destination.
+
+        Matching is case-insensitive; ``partial`` matches substrings the same
+        way the ILIKE queries did.
+        """
+        columns = columns or self.refresh()
+        arrays = columns.arrays
+        mask = arrays['alive'].copy()
+        if origin is not None:
+            mask &= np.isin(arrays['origin'], self.cities.matching_codes(origin, partial))
+        if destination is not None:
+            mask &= np.isin(arrays['destination'], self.cities.matching_codes(destination, partial))
+        return np.flatnonzero(mask)
+
+    def find(self, origin=None, destination=None, partial=False):
+        columns = self.refresh()
+        return self.records(self.match(origin, destination, partial, columns), columns)
+
+    def direct_ids(self, origin, destination, columns=None):
+        """Ids of direct flights: exact city matches, else partial matches."""
+        columns = columns or self.refresh()
+        direct = self.match(origin, destination, columns=columns)
+        if not direct.size:
+            direct = self.match(origin, destination, partial=True, columns=columns)
+        return columns.arrays['id'][direct].tolist()
+
+    def connection_candidates(self, origin, destination, columns=None):
+        """Row numbers of possible legs for a connecting search.
+
+        Returns (first legs, exact second legs, partial second legs) for
+        ``itineraries.connection_pairs``. First legs match the origin exactly,
+        falling back to partial matches.
+        """
+        columns = columns or self.refresh()
+        first_legs = self.match(origin=origin, columns=columns)
+        if not first_legs.size:
+            first_legs = self.match(origin=origin, partial=True, columns=columns)
+        exact_second = self.match(destination=destination, columns=columns)
+        partial_second = self.match(destination=destination, partial=True, columns=columns)
+        return first_legs, exact_second, partial_second
+
+    def hydrate(self, direct_ids, connection_ids):
+        """Turn search result ids into records and connection dicts."""
+        columns = self.refresh()
+        index = columns.index
+        direct = [self._record(columns.arrays, index[flight_id])
+                  for flight_id in direct_ids if flight_id in index]
+
+        connections = []
+        for first_id, second_id in connection_ids:
+            if first_id not in index or second_id not in index:
+                continue
+            first_leg = self._record(columns.arrays, index[first_id])
+            second_leg = self._record(columns.arrays, index[second_id])
+            connections.append({
+                'first_leg': first_leg,
+                'second_leg': second_leg,
+                'total_duration': (second_leg.arrival_time - first_leg.departure_time).total_seconds() / 3600,
+                'connection_time': (second_leg.departure_time - first_leg.arrival_time).total_seconds() / 3600,
+                'total_price_economy': first_leg.economy_price + second_leg.economy_price,
+                'total_price_premium': first_leg.premium_price + second_leg.premium_price,
+                'total_price_business': first_leg.business_price + second_leg.business_price
+            })
+        return direct, connections
+
+
+snapshot = FlightSnapshot()
@@ -0,0 +1,65 @@
+// Live flight status and seat availability updates over Server-Sent Events.
+// Any element with data-live-flight-id is kept in sync; inside it, elements
+// with data-live-field="<field>" have their text replaced when that field changes.
+document.addEventListener('DOMContentLoaded', function() {
+  const containers = document.querySelectorAll('[data-live-flight-id]');
+  if (!containers.length || !window.EventSource) {
+    return;
+  }
+
+  const flightIds = new Set();
+  containers.forEach(function(container) {
+    flightIds.add(container.getAttribute('data-live-flight-id'));
+  });
+
+  // Long lists follow every flight rather than building a huge query string
+  const ids = flightIds.size > 200 ? 'all' : Array.from(flightIds).join(',');
+  const source = new EventSource(`/flights/stream?ids=${ids}`);
+
+  source.addEventListener('snapshot', function(e) {
+    JSON.parse(e.data).forEach(applyFlightDelta);
+  });
+
+  source.addEventListener('flight', function(e) {
+    applyFlightDelta(JSON.parse(e.data));
+  });
+
+  source.addEventListener('resync', function() {
+    // We fell too far behind the feed; reload to get a consistent page
+    source.close();
+    window.location.reload();
+  });
+});
+
+function applyFlightDelta(delta) {
+  const containers = document.querySelectorAll(`[data-live-flight-id="${delta.id}"]`);
+
+  containers.forEach(function(container) {
+    Object.keys(delta).forEach(function(field) {
+      if (field === 'id') {
+        return;
+      }
+      container.querySelectorAll(`[data-live-field="${field}"]`).forEach(function(element) {
+        const value = String(delta[field]);
+        if (element.textContent.trim() === value) {
+          return;
+        }
+        element.textContent = value;
+        if (field === 'status') {
+          updateStatusBadge(element, value);
+        }
+      });
+    });
+  });
+}
+
+function updateStatusBadge(element, status) {
+  element.classList.remove('status-on-time', 'status-delayed', 'status-advance');
+  if (status === 'On Time') {
+    element.classList.add('status-badge', 'status-on-time');
+  } else if (status === 'Delayed') {
+    element.classList.add('status-badge', 'status-delayed');
+  } else if (status === 'Advance') {
+    element.classList.add('status-badge', 'status-advance');
+  }
+}
@@ -0,0 +1,99 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+from itertools import count
+
+import pytest
+from sqlalchemy import event
+
+# The app binds its database and reads its settings at import time
+_db_dir = tempfile.mkdtemp(prefix='airoven-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'airoven.db')}"
+os.environ['SEARCH_POOL_WORKERS'] = '0'
+os.environ['OPERATOR_EMAILS'] = 'ops@airoven.test'
+os.environ['OPERATOR_API_TOKEN'] = 'test-operator-token'
+
+from app import app as flask_app, db  # noqa: E402
+from models import Flight, User  # noqa: E402
+
+OPERATOR_HEADERS = {'Authorization': 'Bearer test-operator-token'}
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        yield flask_app
+        db.session.rollback()
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    def make(email, wallet_balance=0.0):
+        user = User.query.filter_by(email=email).first()
+        if user is not None:
+            user.wallet_balance = wallet_balance
+            db.session.commit()
+            return user
+        user = User(first_name='Test', last_name='User', email=email, age=30, gender='Other',
+                    wallet_balance=wallet_balance, quiz_completed=True)
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    return make
+
+
+_numbers = count(1)
+
+
+@pytest.fixture
+def flight(app):
+    departure = datetime.now() + timedelta(days=3)
+    flight = Flight(
+        flight_number=f'TC{next(_numbers):03d}',
+        origin='Mumbai',
+        destination='Delhi',
+        departure_time=departure,
+        arrival_time=departure + timedelta(hours=2),
+        economy_price=5000.0,
+        premium_price=7500.0,
+        business_price=15000.0,
+        available_seats_economy=100,
+        available_seats_premium=50,
+        available_seats_business=20,
+        aircraft_type='Airbus A320',
+        distance_km=1150,
+    )
+    db.session.add(flight)
+    db.session.commit()
+    return flight
+
+
+def log_in(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+
+
+def locked_tables(action):
+    """Run ``action`` and return the tables it selected FOR UPDATE."""
+    # SQLite drops FOR UPDATE when compiling, so look at the statements
+    locked = []
+
+    def before_execute(conn, clauseelement, multiparams, params, execution_options):
+        if getattr(clauseelement, '_for_update_arg', None) is not None:
+            locked.extend(table.name for table in clauseelement.get_final_froms())
+
+    event.listen(db.engine, 'before_execute', before_execute)
+    try:
+        action()
+    finally:
+        event.remove(db.engine, 'before_execute', before_execute)
+    return locked
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from itertools import count
+
+from analytics import analytics_summary, refresh_analytics
+from app import db
+from archive import archive_flight_chunk
+from models import Booking, Flight
+
+_routes = count(1)
+
+
+def add_flight(departure, destination=None):
+    flight = Flight(
+        flight_number=f'AN{next(_routes):03d}', origin='Agra', destination=destination or f'Stop {next(_routes)}',
+        departure_time=departure, arrival_time=departure + timedelta(hours=1),
+        economy_price=3000.0, premium_price=5000.0, business_price=9000.0, aircraft_type='ATR 72',
+        available_seats_economy=10, available_seats_premium=4, available_seats_business=2,
+    )
+    db.session.add(flight)
+    db.session.commit()
+    return flight
+
+
+def book(user, flight, travel_class, price):
+    assert flight.book_seat(travel_class)
+    db.session.add(Booking(
+        user_id=user.id, flight_id=flight.id, travel_class=travel_class, seat_number='A1', price_paid=price,
+        passenger_name='Analytics Test', passenger_age=35, passenger_gender='Other', status='Confirmed',
+    ))
+    db.session.commit()
+
+
+def summary():
+    data = analytics_summary(limit=500)
+    return {key: data[key] for key in ('totals', 'routes', 'flights')}
+
+
+def route(data, destination):
+    return next(r for r in data['routes'] if r['origin'] == 'Agra' and r['destination'] == destination)
+
+
+def test_incremental_refresh_matches_a_full_rebuild(app, make_user):
+    user = make_user('analytics@airoven.test', wallet_balance=100000)
+    soon = datetime.now() + timedelta(days=5)
+    first, second = add_flight(soon), add_flight(soon)
+    refresh_analytics(full=True)
+
+    book(user, first, 'economy', 3000.0)
+    book(user, first, 'business', 9000.0)
+    book(user, second, 'premium', 5000.0)
+    db.session.get(Flight, second.id).destination = first.destination
+    db.session.commit()
+
+    assert refresh_analytics() == 2
+    incremental = summary()
+    refresh_analytics(full=True)
+    assert incremental == summary()
+
+    trip = route(incremental, first.destination)
+    assert trip['flights'] == 2
+    assert trip['seats_sold'] == 3
+    assert trip['revenue'] == {'economy': 3000.0, 'premium': 5000.0, 'business': 9000.0}
+
+
+def test_archived_flights_stay_in_the_figures(app, make_user):
+    user = make_user('analytics@airoven.test', wallet_balance=100000)
+    departed = add_flight(datetime.now() - timedelta(days=40))
+    destination = departed.destination
+    book(user, departed, 'economy', 3000.0)
+    refresh_analytics()
+    before = summary()
+
+    archive_flight_chunk([departed.id], datetime.utcnow())
+    db.session.commit()
+    refresh_analytics()
+
+    after = summary()
+    assert after['totals'] == before['totals']
+    assert route(after, destination) == route(before, destination)
+    refresh_analytics(full=True)
+    assert summary() == after
@@ -0,0 +1,26 @@
+import pytest
+
+from conftest import log_in
+
+
+@pytest.mark.parametrize('path', [
+    '/api/v1/flights',
+    '/api/v1/flights/1',
+    '/api/v1/search?origin=Mumbai&destination=Delhi',
+    '/api/v1/bookings',
+])
+def test_anonymous_clients_get_a_json_401(client, path):
+    response = client.get(path)
+
+    assert response.status_code == 401
+    assert response.is_json
+    assert response.get_json() == {'error': 'Authentication required.'}
+
+
+def test_signed_in_clients_are_served(client, make_user, flight):
+    log_in(client, make_user('api-client@airoven.test'))
+
+    response = client.get(f'/api/v1/flights/{flight.id}')
+
+    assert response.status_code == 200
+    assert response.get_json()['flight_number'] == flight.flight_number
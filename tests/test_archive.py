@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+from app import db
+from archive import archive_departed_flights, archive_flight_chunk
+from conftest import OPERATOR_HEADERS, locked_tables, log_in
+from models import Booking, BookingArchive, Flight, FlightArchive
+
+
+def departed_flight(flight_id, flight_number, user):
+    departure = datetime.now() - timedelta(days=40)
+    flight = Flight(
+        id=flight_id, flight_number=flight_number, origin='Pune', destination='Jaipur',
+        departure_time=departure, arrival_time=departure + timedelta(hours=2),
+        economy_price=4000.0, premium_price=6000.0, business_price=12000.0, aircraft_type='Airbus A320',
+    )
+    db.session.add(flight)
+    db.session.flush()
+    db.session.add(Booking(
+        user_id=user.id, flight_id=flight.id, travel_class='economy', seat_number='E1', price_paid=4000.0,
+        passenger_name=f'Passenger of {flight_number}', passenger_age=40, passenger_gender='Other',
+    ))
+    db.session.commit()
+    return flight
+
+
+def unused_flight_id():
+    # An id neither live nor archived yet, so only the calling test's flights share it
+    return max(db.session.scalar(db.select(db.func.max(model.id))) or 0 for model in (Flight, FlightArchive)) + 1
+
+
+def archive(flight_id):
+    archive_flight_chunk([flight_id], datetime.utcnow())
+    db.session.commit()
+
+
+def test_reused_live_ids_are_archived_separately(app, client, make_user):
+    user = make_user('archive-owner@airoven.test')
+    flight_id = unused_flight_id()
+
+    # SQLite hands the id of a deleted flight to the next one inserted
+    archive(departed_flight(flight_id, 'AR001', user).id)
+    archive(departed_flight(flight_id, 'AR002', user).id)
+
+    archived = db.session.scalars(
+        db.select(FlightArchive).where(FlightArchive.id == flight_id).order_by(FlightArchive.archive_id)
+    ).all()
+    assert [flight.flight_number for flight in archived] == ['AR001', 'AR002']
+    assert [[booking.passenger_name for booking in flight.bookings] for flight in archived] == [
+        ['Passenger of AR001'], ['Passenger of AR002'],
+    ]
+    assert db.session.scalar(
+        db.select(db.func.count(BookingArchive.archive_id)).where(BookingArchive.flight_id == flight_id)
+    ) == 2
+
+    for flight in archived:
+        response = client.get(f'/flights/archive/{flight.archive_id}/manifest', headers=OPERATOR_HEADERS)
+        assert response.status_code == 200
+        assert f'Passenger of {flight.flight_number}' in response.get_data(as_text=True)
+
+
+def test_archiving_locks_each_chunk_of_flights(app, make_user):
+    user = make_user('archive-owner@airoven.test')
+    flight_id = unused_flight_id()
+    departed_flight(flight_id, 'AR003', user)
+
+    assert locked_tables(lambda: archive_departed_flights(30, 100))[:1] == ['flight']
+    assert db.session.get(Flight, flight_id) is None
+
+
+def test_departed_flights_cannot_be_booked(app, client, make_user, monkeypatch):
+    monkeypatch.setitem(app.config, 'WTF_CSRF_ENABLED', False)
+    user = make_user('late-traveller@airoven.test', wallet_balance=100000)
+    flight_id = unused_flight_id()
+    departed_flight(flight_id, 'AR004', user)
+    log_in(client, user)
+
+    response = client.post(f'/book_flight/{flight_id}', data={
+        'flight_id': flight_id, 'travel_class': 'economy', 'passenger_name': 'Too Late',
+        'passenger_age': 30, 'passenger_gender': 'Other', 'contact_number': '9999999999',
+    })
+
+    assert response.headers['Location'].endswith(f'/flight_details/{flight_id}')
+    assert db.session.scalar(db.select(db.func.count(Booking.id)).where(Booking.flight_id == flight_id)) == 1
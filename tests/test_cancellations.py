@@ -0,0 +1,107 @@
+import re
+
+from app import db
+from conftest import OPERATOR_HEADERS, locked_tables, log_in
+from models import Booking, Flight, User
+
+
+def book(user, flight, travel_class, price):
+    assert flight.book_seat(travel_class)
+    user.wallet_balance -= price
+    booking = Booking(
+        user_id=user.id, flight_id=flight.id, travel_class=travel_class, seat_number='X1',
+        price_paid=price, passenger_name=f'{user.first_name} {travel_class}', passenger_age=30,
+        passenger_gender='Other', status='Confirmed',
+    )
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+def cancel(client, payload, **kwargs):
+    return client.post('/api/flights/cancel', json=payload, **kwargs)
+
+
+def test_cancellation_refunds_in_full_and_releases_seats(client, make_user, flight):
+    alice = make_user('alice-cancel@airoven.test', wallet_balance=50000.0)
+    bob = make_user('bob-cancel@airoven.test', wallet_balance=50000.0)
+
+    # Alice books three passengers across all classes, Bob books two
+    book(alice, flight, 'economy', 5000.0)
+    book(alice, flight, 'premium', 7500.0)
+    book(alice, flight, 'business', 15000.0)
+    book(bob, flight, 'economy', 4800.0)
+    book(bob, flight, 'economy', 5200.0)
+
+    # A booking the passenger cancelled earlier is not refunded again
+    earlier = book(bob, flight, 'business', 15000.0)
+    earlier.status = 'Cancelled'
+    db.session.commit()
+
+    response = cancel(client, {'flight_ids': [flight.id]}, headers=OPERATOR_HEADERS)
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'flights_cancelled': 1,
+        'bookings_cancelled': 5,
+        'amount_refunded': 37500.0,
+    }
+
+    db.session.expire_all()
+    assert db.session.get(User, alice.id).wallet_balance == 50000.0
+    assert db.session.get(User, bob.id).wallet_balance == 50000.0 - 15000.0
+
+    cancelled = db.session.get(Flight, flight.id)
+    assert cancelled.status == 'Cancelled'
+    assert cancelled.available_seats_economy == 100
+    assert cancelled.available_seats_premium == 50
+    # The earlier cancellation never released its seat, so it stays taken
+    assert cancelled.available_seats_business == 19
+
+    statuses = db.session.scalars(db.select(Booking.status).where(Booking.flight_id == flight.id)).all()
+    assert statuses == ['Cancelled'] * 6
+
+    # Cancelling again refunds nothing
+    response = cancel(client, {'flight_ids': [flight.id]}, headers=OPERATOR_HEADERS)
+    assert response.get_json()['amount_refunded'] == 0.0
+    db.session.expire_all()
+    assert db.session.get(User, alice.id).wallet_balance == 50000.0
+
+
+def test_customers_cannot_cancel_flights(client, make_user, flight):
+    customer = make_user('customer-cancel@airoven.test', wallet_balance=10000.0)
+    book(customer, flight, 'economy', 5000.0)
+    log_in(client, customer)
+
+    assert cancel(client, {'flight_ids': [flight.id]}).status_code == 403
+    assert cancel(client, {'flight_ids': [flight.id]},
+                  headers={'Authorization': 'Bearer wrong-token'}).status_code == 403
+
+    db.session.expire_all()
+    assert db.session.get(User, customer.id).wallet_balance == 5000.0
+    assert db.session.get(Flight, flight.id).status == 'On Time'
+
+
+def test_operator_sessions_need_the_csrf_token(client, make_user, flight):
+    log_in(client, make_user('ops@airoven.test'))
+
+    assert cancel(client, {'flight_ids': [flight.id]}).status_code == 400
+
+    page = client.get('/wallet').get_data(as_text=True)
+    token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+    response = cancel(client, {'flight_ids': [flight.id]}, headers={'X-CSRFToken': token})
+    assert response.status_code == 200
+    assert response.get_json()['flights_cancelled'] == 1
+
+
+def test_cancelling_and_booking_lock_the_flight(app, client, make_user, flight, monkeypatch):
+    from cancellations import cancel_flights
+
+    monkeypatch.setitem(app.config, 'WTF_CSRF_ENABLED', False)
+    log_in(client, make_user('locker@airoven.test', wallet_balance=100000))
+    booked = locked_tables(lambda: client.post(f'/book_flight/{flight.id}', data={}))
+    cancelled = locked_tables(lambda: cancel_flights([flight.id]))
+    db.session.rollback()
+
+    assert booked == ['flight']
+    assert cancelled[:1] == ['flight']
@@ -0,0 +1,16 @@
+import pytest
+
+from encoding import negotiate_encoding
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None),
+    ('gzip', 'gzip'),
+    ('br;q=0.5, gzip', 'gzip'),
+    ('gzip;q=0, br;q=0', None),
+    ('*', 'br'),
+    ('deflate, *;q=0.1', 'br'),
+    ('identity', None),
+])
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header, ('br', 'gzip')) == expected
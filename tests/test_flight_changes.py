@@ -0,0 +1,32 @@
+from app import db
+from cache import current_flight_data_version, record_flight_changes_by_id
+from models import Flight, FlightChange
+
+
+def changes_since(version):
+    return db.session.execute(
+        db.select(FlightChange.flight_id, FlightChange.version).where(FlightChange.version > version)
+    ).all()
+
+
+def test_each_transaction_stamps_its_changes_with_the_next_version(app, flight):
+    before = current_flight_data_version()
+
+    db.session.get(Flight, flight.id).status = 'Delayed'
+    record_flight_changes_by_id([flight.id])
+    db.session.commit()
+
+    assert current_flight_data_version() == before + 1
+    assert changes_since(before) == [(flight.id, before + 1), (flight.id, before + 1)]
+
+
+def test_rolled_back_changes_do_not_bump_the_version(app, flight):
+    before = current_flight_data_version()
+
+    db.session.get(Flight, flight.id).status = 'Delayed'
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+
+    assert current_flight_data_version() == before
+    assert db.session.scalar(db.select(db.func.count(FlightChange.id)).where(FlightChange.version.is_(None))) == 0
@@ -0,0 +1,40 @@
+from app import db
+from conftest import OPERATOR_HEADERS, log_in
+from models import Flight
+
+
+def update_status(client, updates, **kwargs):
+    return client.post('/api/flights/status', json={'updates': updates}, **kwargs)
+
+
+def test_operators_update_statuses(client, flight):
+    response = update_status(client, [{'id': flight.id, 'status': 'Delayed'}], headers=OPERATOR_HEADERS)
+
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert db.session.get(Flight, flight.id).status == 'Delayed'
+
+
+def test_customers_cannot_update_statuses(client, make_user, flight):
+    log_in(client, make_user('customer-status@airoven.test'))
+
+    assert update_status(client, [{'id': flight.id, 'status': 'Delayed'}]).status_code == 403
+
+
+def test_cancelling_goes_through_the_cancellation_api(client, flight):
+    response = update_status(client, [{'id': flight.id, 'status': 'Cancelled'}], headers=OPERATOR_HEADERS)
+
+    assert response.status_code == 400
+    db.session.expire_all()
+    assert db.session.get(Flight, flight.id).status == 'On Time'
+
+
+def test_cancelled_flights_keep_their_status(client, flight):
+    client.post('/api/flights/cancel', json={'flight_ids': [flight.id]}, headers=OPERATOR_HEADERS)
+
+    response = update_status(client, [{'id': flight.id, 'status': 'Delayed'}], headers=OPERATOR_HEADERS)
+
+    assert response.status_code == 409
+    assert response.get_json()['cancelled'] == [flight.id]
+    db.session.expire_all()
+    assert db.session.get(Flight, flight.id).status == 'Cancelled'
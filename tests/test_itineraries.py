@@ -0,0 +1,115 @@
+import time
+
+import numpy as np
+import pytest
+
+from itineraries import ItineraryPool, connection_pairs
+from search import MIN_CONNECTION_HOURS
+
+START = np.datetime64('2030-01-01T06:00', 's')
+LAYOVER = MIN_CONNECTION_HOURS * 3600
+
+# City codes
+ORIGIN, HUB, OTHER_HUB, DESTINATION, NEAR_DESTINATION = range(5)
+
+
+def timetable(legs):
+    """Arrays for legs given as (id, origin, destination, departs, arrives) in hours after START."""
+    ids, origins, destinations, departures, arrivals = zip(*legs)
+    hours = lambda values: START + (np.array(values) * 3600).astype('timedelta64[s]')  # noqa: E731
+    return {
+        'id': np.array(ids, dtype=np.int64),
+        'origin': np.array(origins, dtype=np.int32),
+        'destination': np.array(destinations, dtype=np.int32),
+        'departure_time': hours(departures),
+        'arrival_time': hours(arrivals),
+    }
+
+
+def rows(table, *flight_ids):
+    return np.flatnonzero(np.isin(table['id'], flight_ids))
+
+
+def test_exact_second_legs_are_preferred_over_partial_ones():
+    table = timetable([
+        (1, ORIGIN, HUB, 0, 2),
+        (2, ORIGIN, OTHER_HUB, 0, 2),
+        (10, HUB, DESTINATION, 5, 7),
+        (11, HUB, NEAR_DESTINATION, 5, 7),
+        (12, OTHER_HUB, NEAR_DESTINATION, 5, 7),
+    ])
+
+    pairs, complete = connection_pairs(
+        table, rows(table, 1, 2), rows(table, 10), rows(table, 10, 11, 12), LAYOVER)
+
+    # The hub with an exact match ignores its partial one; the other hub falls back
+    assert pairs == [(1, 10), (2, 12)]
+    assert complete
+
+
+def test_second_legs_must_leave_more_than_the_minimum_layover_after_arrival():
+    table = timetable([
+        (1, ORIGIN, HUB, 0, 2),
+        (10, HUB, DESTINATION, 3, 5),
+        (11, HUB, DESTINATION, 4, 6),
+        (12, HUB, DESTINATION, 4.25, 6),
+        (13, HUB, DESTINATION, 1, 3),
+    ])
+    second = rows(table, 10, 11, 12, 13)
+
+    pairs, _ = connection_pairs(table, rows(table, 1), second, second, LAYOVER)
+
+    assert MIN_CONNECTION_HOURS == 2
+    assert pairs == [(1, 12)]
+
+
+def test_the_result_cap_keeps_the_shortest_journeys():
+    legs = [(first, ORIGIN, HUB, first, first + 1) for first in range(1, 21)]
+    legs += [(100 + n, HUB, DESTINATION, 30 + n, 31 + n) for n in range(5)]
+    table = timetable(legs)
+    first, second = rows(table, *range(1, 21)), rows(table, *range(100, 105))
+
+    pairs, complete = connection_pairs(table, first, second, second, LAYOVER, max_results=3)
+
+    # Latest first leg with the earliest second legs, in first-leg order
+    assert pairs == [(19, 100), (20, 100), (20, 101)]
+    assert not complete
+
+    everything, complete = connection_pairs(table, first, second, second, LAYOVER)
+    assert len(everything) == 100
+    assert complete
+
+
+def test_searches_stop_at_the_deadline():
+    table = timetable([(1, ORIGIN, HUB, 0, 2), (10, HUB, DESTINATION, 5, 7)])
+
+    pairs, complete = connection_pairs(
+        table, rows(table, 1), rows(table, 10), rows(table, 10), LAYOVER, deadline=time.time() - 1)
+
+    assert pairs == []
+    assert not complete
+
+
+@pytest.fixture
+def pool():
+    pool = ItineraryPool()
+    pool.configure(workers=1, max_pending=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_a_saturated_pool_searches_inline(pool):
+    table = timetable([(1, ORIGIN, HUB, 0, 2), (10, HUB, DESTINATION, 5, 7)])
+    args = (rows(table, 1), rows(table, 10), rows(table, 10), LAYOVER)
+
+    assert pool._slots.acquire(blocking=False)
+    try:
+        result = pool.search(table, 1, *args, max_results=10, deadline=time.time() + 5)
+    finally:
+        pool._slots.release()
+
+    assert result == ([(1, 10)], True)
+    assert pool.stats()['inline_fallbacks'] == 1
+    assert pool.stats()['offloaded'] == 0
+    # Nothing was started for the inline search
+    assert pool._executor is None
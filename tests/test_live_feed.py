@@ -0,0 +1,43 @@
+from app import db
+from cache import current_flight_data_version
+from conftest import log_in
+from models import Flight
+
+
+def test_feed_is_off_by_default(client, make_user, flight):
+    log_in(client, make_user('viewer@airoven.test'))
+
+    assert client.get(f'/flights/stream?ids={flight.id}').status_code == 404
+    assert b'js/live.js' not in client.get(f'/flight_details/{flight.id}').data
+    assert b'js/live.js' not in client.get('/flight_schedules').data
+
+
+def test_pages_load_the_feed_when_enabled(app, client, make_user, flight, monkeypatch):
+    monkeypatch.setitem(app.config, 'LIVE_FEED_ENABLED', True)
+    log_in(client, make_user('viewer@airoven.test'))
+
+    assert b'js/live.js' in client.get(f'/flight_details/{flight.id}').data
+
+
+def test_streams_follow_writes_made_anywhere(app, flight, monkeypatch):
+    from events import FlightEventBroker
+
+    # Poll by hand rather than from the follower thread
+    monkeypatch.setitem(app.config, 'LIVE_FEED_POLL_SECONDS', 3600)
+    broker = FlightEventBroker()
+    watching = broker.subscribe({flight.id})
+    elsewhere = broker.subscribe({flight.id + 1000})
+
+    # A plain ORM write, as another worker or the CLI would make it
+    db.session.get(Flight, flight.id).status = 'Delayed'
+    db.session.commit()
+    broker.poll()
+
+    version, delta = watching.queue.get_nowait()
+    assert version == current_flight_data_version()
+    assert delta['id'] == flight.id
+    assert delta['status'] == 'Delayed'
+    assert elsewhere.queue.empty()
+
+    broker.poll()
+    assert watching.queue.empty()
@@ -0,0 +1,25 @@
+import pytest
+
+from conftest import OPERATOR_HEADERS, log_in
+
+OPERATOR_PAGES = [
+    '/admin/analytics',
+    '/admin/cache_stats',
+    '/flights/1/manifest',
+    '/bookings/export?start=2024-01-01&end=2024-12-31',
+]
+
+
+@pytest.mark.parametrize('path', OPERATOR_PAGES)
+def test_customers_are_refused(client, make_user, path):
+    log_in(client, make_user('customer-admin@airoven.test'))
+
+    assert client.get(path).status_code == 403
+
+
+@pytest.mark.parametrize('path', OPERATOR_PAGES)
+def test_operators_are_served(client, make_user, path):
+    assert client.get(path, headers=OPERATOR_HEADERS).status_code == 200
+
+    log_in(client, make_user('ops@airoven.test'))
+    assert client.get(path).status_code == 200
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app import db
+from models import FareBasis, Flight
+from pricing import (DEFAULT_FARE_CURVES, claim_scheduled_run, compute_fares, get_fare_curves,
+                     reprice_all_flights)
+
+NOW = datetime(2030, 1, 1, 12, 0)
+
+
+def inventory(available, days, capacity=(100, 50, 20), base=(1000.0, 2000.0, 4000.0)):
+    # One flight with the given seats left per class, departing in ``days``
+    return {
+        'id': np.array([1]),
+        'departure': np.array([NOW + timedelta(days=days)], dtype='datetime64[s]'),
+        'available': np.array([[seats] for seats in available], dtype=np.float64),
+        'price': np.array([[fare] for fare in base], dtype=np.float64),
+        'capacity': np.array([[seats] for seats in capacity], dtype=np.float64),
+        'base': np.array([[fare] for fare in base], dtype=np.float64),
+    }
+
+
+def fares(available, days, curves=DEFAULT_FARE_CURVES, **kwargs):
+    return compute_fares(inventory(available, days, **kwargs), NOW, curves)[:, 0].tolist()
+
+
+def test_half_full_flights_two_weeks_out_sell_at_the_base_fare():
+    assert fares((50, 25, 10), days=14) == [1000.0, 2000.0, 4000.0]
+
+
+def test_fares_follow_the_load_factor_curve():
+    # Economy 80% sold, premium full, business empty
+    assert fares((20, 0, 20), days=14) == [1200.0, 3200.0, 3800.0]
+    # A class without capacity counts as full
+    assert fares((50, 25, 0), days=14, capacity=(100, 50, 0))[2] == 6000.0
+
+
+def test_fares_follow_the_days_to_departure_curve():
+    assert fares((50, 25, 10), days=3)[0] == 1350.0
+    assert fares((50, 25, 10), days=10.5)[0] == pytest.approx(1075.0)
+    # Beyond the last point the curve stays flat
+    assert fares((50, 25, 10), days=365)[0] == 900.0
+
+
+def test_multipliers_are_clamped():
+    curves = dict(DEFAULT_FARE_CURVES, min_multiplier=0.95, max_multiplier=1.5)
+    # Full and departing today: 1.8 * 1.6 before clamping
+    assert fares((0, 0, 0), days=0, curves=curves) == [1500.0, 3000.0, 6000.0]
+    # Empty and months away: 0.85 * 0.9 before clamping
+    assert fares((100, 50, 20), days=90, curves=curves)[0] == 950.0
+
+
+def test_overriding_one_class_keeps_the_other_curves(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'FARE_CURVES', {'load_factor': {'economy': ([0.0, 1.0], [1.0, 1.0])}})
+
+    curves = get_fare_curves(app)
+
+    assert curves['load_factor']['economy'] == ([0.0, 1.0], [1.0, 1.0])
+    assert curves['load_factor']['business'] == DEFAULT_FARE_CURVES['load_factor']['business']
+    assert fares((0, 0, 0), days=14, curves=curves) == [1000.0, 3200.0, 6000.0]
+
+
+def test_repricing_is_idempotent_and_skips_cancelled_and_departed_flights(app, flight):
+    now = flight.departure_time - timedelta(days=3)
+    cancelled = Flight(
+        flight_number=f'{flight.flight_number}C', origin='Delhi', destination='Pune',
+        departure_time=flight.departure_time, arrival_time=flight.arrival_time,
+        economy_price=5000.0, premium_price=7500.0, business_price=15000.0,
+        aircraft_type='Airbus A320', status='Cancelled',
+    )
+    departed = Flight(
+        flight_number=f'{flight.flight_number}D', origin='Delhi', destination='Pune',
+        departure_time=now - timedelta(hours=3), arrival_time=now - timedelta(hours=1),
+        economy_price=5000.0, premium_price=7500.0, business_price=15000.0,
+        aircraft_type='Airbus A320',
+    )
+    db.session.add_all([cancelled, departed])
+    db.session.commit()
+
+    assert reprice_all_flights(app, now) > 0
+    assert reprice_all_flights(app, now) == 0
+
+    db.session.expire_all()
+    # The empty flight three days out: 0.85 (economy load) * 1.35 (days)
+    assert db.session.get(Flight, flight.id).economy_price == pytest.approx(5000.0 * 0.85 * 1.35)
+    assert db.session.get(FareBasis, flight.id).base_economy_price == 5000.0
+    for skipped in (cancelled, departed):
+        assert db.session.get(Flight, skipped.id).economy_price == 5000.0
+
+
+def test_each_scheduled_interval_is_claimed_once(app):
+    start = datetime(2030, 1, 1)
+
+    assert claim_scheduled_run('test-job', 60, start)
+    assert not claim_scheduled_run('test-job', 60, start + timedelta(seconds=30))
+    assert claim_scheduled_run('test-job', 60, start + timedelta(seconds=61))
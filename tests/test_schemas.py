@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from app import db
+from models import Flight
+from schemas import SCHEDULE_SCHEMA
+from snapshot import snapshot
+from conftest import log_in
+
+
+def test_flight_path(client, make_user, flight):
+    log_in(client, make_user('traveller@airoven.test'))
+
+    response = client.get(f'/get_flight_path/{flight.id}')
+
+    assert response.get_json() == {
+        'origin': {'name': 'Mumbai', 'coords': [19.0760, 72.8777]},
+        'destination': {'name': 'Delhi', 'coords': [28.7041, 77.1025]},
+        'flight_number': flight.flight_number,
+        'distance_km': 1150,
+        'duration_hours': 2.0,
+    }
+
+
+def test_connecting_flight_path(client, make_user, flight):
+    second = Flight(
+        flight_number=f'{flight.flight_number}X', origin='Delhi', destination='Atlantis',
+        departure_time=flight.arrival_time + timedelta(minutes=90),
+        arrival_time=flight.arrival_time + timedelta(hours=4),
+        economy_price=1.0, premium_price=2.0, business_price=3.0,
+        aircraft_type='Airbus A320', distance_km=900,
+    )
+    db.session.add(second)
+    db.session.commit()
+    log_in(client, make_user('traveller@airoven.test'))
+
+    data = client.get(f'/get_connecting_flight_path/{flight.id}/{second.id}').get_json()
+
+    assert data['connection'] == {'name': 'Delhi', 'coords': [28.7041, 77.1025]}
+    assert data['destination'] == {'name': 'Atlantis', 'coords': [0, 0]}
+    assert data['second_leg'] == {'flight_number': second.flight_number, 'distance_km': 900,
+                                  'duration_hours': 2.5}
+    assert data['connection_time_hours'] == 1.5
+
+
+def test_schedule_rows(app, flight):
+    row = SCHEDULE_SCHEMA.dump(snapshot.get(flight.id))
+
+    assert row['departure_time_str'] == flight.departure_time.strftime('%d-%b-%Y %H:%M')
+    assert row['duration_hours'] == 2.0
+    assert set(row) == {
+        'id', 'flight_number', 'origin', 'destination', 'departure_time_str', 'arrival_time_str',
+        'duration_hours', 'status', 'economy_price', 'premium_price', 'business_price', 'aircraft_type',
+    }
@@ -0,0 +1,41 @@
+from app import app as flask_app, db
+from cache import flight_data_version
+from models import Flight
+from snapshot import snapshot
+
+
+def test_requests_with_an_older_version_do_not_roll_the_snapshot_back(app, flight, monkeypatch):
+    full_loads = []
+    full_load = snapshot._full_load
+    monkeypatch.setattr(snapshot, '_full_load', lambda version: full_loads.append(version) or full_load(version))
+
+    with flask_app.app_context():
+        # This request memoises the flight table version before the change below
+        stale_version = flight_data_version()
+        snapshot.refresh()
+
+        with flask_app.app_context():
+            db.session.get(Flight, flight.id).status = 'Delayed'
+            db.session.commit()
+            assert snapshot.refresh().version > stale_version
+
+        columns = snapshot.refresh()
+        assert columns.version > stale_version
+        assert snapshot.get(flight.id).status == 'Delayed'
+
+    assert full_loads in ([], [stale_version])
+
+
+def test_payloads_are_cached_per_flight_version(app, flight):
+    from api import payload_cache
+
+    before = snapshot.get(flight.id)
+    assert b'"economy":5000.0' in payload_cache.flight(before)
+
+    db.session.get(Flight, flight.id).economy_price = 6100.0
+    db.session.commit()
+
+    with flask_app.app_context():
+        after = snapshot.get(flight.id)
+        assert after.version > before.version
+        assert b'"economy":6100.0' in payload_cache.flight(after)